@@ -1,29 +1,140 @@
+import asyncio
+import hashlib
+import logging
 import os
-import traceback
+import queue
+import re
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import asynccontextmanager
-from typing import Literal, Optional
+from itertools import islice
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Literal, Optional, Tuple
 
+import httpx
+import torch
 import uvicorn
+from cachetools import TTLCache
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field, model_validator
 
+from config import Config
 from fact_checker import FactChecker
 
 
+logger = logging.getLogger(__name__)
+
 fact_checker_instance: Optional[FactChecker] = None
+fact_checker_ready = False
+
+# Cache kết quả /api/check theo (input_type, num_sources, content)
+response_cache: Optional[TTLCache] = (
+    TTLCache(maxsize=1024, ttl=Config.CACHE_TTL_HOURS * 3600)
+    if Config.ENABLE_CACHE
+    else None
+)
+_inflight_checks: Dict[str, asyncio.Task] = {}
+
+
+def _setup_queue_logging() -> Tuple[QueueListener, List[logging.Handler]]:
+    # Handler gốc (stdout) chạy trong thread của QueueListener; event loop
+    # chỉ đẩy bản ghi vào hàng đợi nên không bị chặn bởi I/O ghi log
+    root = logging.getLogger()
+    root.setLevel(Config.LOG_LEVEL)
+    original_handlers = root.handlers[:]
+    handlers = original_handlers or [logging.StreamHandler()]
+    for handler in original_handlers:
+        root.removeHandler(handler)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener, original_handlers
+
+
+def _teardown_queue_logging(
+    listener: QueueListener, original_handlers: List[logging.Handler]
+):
+    listener.stop()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in original_handlers:
+        root.addHandler(handler)
+
+
+def _init_parse_worker(log_level: str):
+    # Process con (fork) thừa hưởng QueueHandler của process cha nhưng không
+    # có QueueListener nào đọc hàng đợi: bản ghi sẽ mất và dồn lại trong bộ
+    # nhớ. Ghi log trực tiếp ra stderr thay vào đó
+    logging.basicConfig(level=log_level, force=True)
+
+
+async def _load_fact_checker(
+    http_client: httpx.AsyncClient, process_pool: ProcessPoolExecutor
+):
+    global fact_checker_instance, fact_checker_ready
+    try:
+        # Nạp model trong threadpool để không chặn event loop
+        checker = await asyncio.to_thread(
+            FactChecker, http_client=http_client, process_pool=process_pool
+        )
+        # Encode thử một lần để request đầu tiên không bị cold start
+        await asyncio.to_thread(checker.similarity_checker.model.encode, ["warmup"])
+        # PhoBERT đã được nạp song song ở thread nền; chờ xong mới báo ready
+        await asyncio.to_thread(getattr, checker.preprocessor, "phobert")
+    except Exception as e:
+        logger.exception(
+            "[API] Failed to initialize Fact Checker: %s - %s", type(e).__name__, e
+        )
+        return
+
+    # Gom các request đồng thời để dùng chung lượt chạy model
+    checker.start_batching(
+        max_batch_size=Config.BATCH_MAX_SIZE, max_wait_ms=Config.BATCH_MAX_WAIT_MS
+    )
+    fact_checker_instance = checker
+    fact_checker_ready = True
+    logger.info("Fact Checker initialized and warmed up!")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
 
-    global fact_checker_instance
-    print("Starting up Fact Checker API...")
-    fact_checker_instance = FactChecker()
-    print("Fact Checker initialized successfully!")
+    log_listener, original_log_handlers = _setup_queue_logging()
+    logger.info("Starting up Fact Checker API...")
+    # Đã chạy trong __main__ thì bỏ qua; cần khi chạy trực tiếp `uvicorn api:app`
+    Config.validate()
+    # Một client HTTP/2 dùng chung toàn app: các request tới archive.org và
+    # google.com được ghép kênh (multiplex) trên cùng một kết nối
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        timeout=10,
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=20),
+    )
+    # Mặc định torch dùng mọi nhân CPU trong mỗi worker: chia đều để các
+    # worker không tranh nhau luồng
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // Config.API_WORKERS))
+    # Process pool dùng chung cho việc phân tích HTML (tốn CPU), chia đều số
+    # nhân CPU cho các worker uvicorn. Config.API_WORKERS phải bằng số worker
+    # thực tế (`--workers` của uvicorn); `python api.py` tự dùng giá trị này
+    process_pool = ProcessPoolExecutor(
+        max_workers=max(1, (os.cpu_count() or 1) // Config.API_WORKERS),
+        initializer=_init_parse_worker,
+        initargs=(Config.LOG_LEVEL,),
+    )
+    # Server nhận kết nối ngay; /health báo ready sau khi nạp xong model
+    loader = asyncio.create_task(_load_fact_checker(app.state.http, process_pool))
     yield
-    print("Shutting down API.")
+    logger.info("Shutting down API.")
+    loader.cancel()
+    if fact_checker_instance is not None:
+        await fact_checker_instance.aclose()
+    await app.state.http.aclose()
+    process_pool.shutdown(wait=False, cancel_futures=True)
+    _teardown_queue_logging(log_listener, original_log_handlers)
 
 
 # Khởi tạo FastAPI app với lifespan
@@ -32,6 +143,8 @@ app = FastAPI(
     description="API để phát hiện tin giả trên mạng xã hội",
     version="1.0.1",
     lifespan=lifespan,
+    # orjson nhanh hơn json chuẩn với payload tiếng Việt (Unicode) lớn
+    default_response_class=ORJSONResponse,
 )
 
 # CORS middleware
@@ -46,6 +159,8 @@ app.add_middleware(
 
 # --- Các Lớp Model (Pydantic) ---
 
+_WORD_RE = re.compile(r"\S+")
+
 
 class FactCheckRequest(BaseModel):
 
@@ -61,7 +176,8 @@ class FactCheckRequest(BaseModel):
             raise ValueError("Content không được để trống")
 
         if self.input_type == "text":
-            word_count = len(self.content.split())
+            # Chỉ đếm tối đa 3 từ thay vì tách toàn bộ nội dung thành list
+            word_count = sum(1 for _ in islice(_WORD_RE.finditer(self.content), 3))
             if word_count < 3:
                 raise ValueError("Content quá ngắn (tối thiểu 3 từ)")
 
@@ -94,49 +210,80 @@ async def root():
 
 @app.get("/health", tags=["Health"])
 async def health_check():
-    return {
-        "status": "healthy",
-        "fact_checker_initialized": fact_checker_instance is not None,
-        "endpoints": {"check": "/api/check", "health": "/health"},
-    }
+    # Trả 503 cho tới khi model đã warmup để load balancer chưa định tuyến tới
+    return ORJSONResponse(
+        status_code=200 if fact_checker_ready else 503,
+        content={
+            "status": "healthy" if fact_checker_ready else "starting",
+            "ready": fact_checker_ready,
+            "fact_checker_initialized": fact_checker_instance is not None,
+            "endpoints": {"check": "/api/check", "health": "/health"},
+        },
+    )
+
+
+async def _run_check(request: FactCheckRequest, cache_key: str) -> dict:
+    # Chạy pipeline kiểm tra; các bước chạy model được gom lô bên trong
+    result = await fact_checker_instance.check_fact(
+        user_input=request.content,
+        input_type=request.input_type,
+        num_sources=request.num_sources,
+    )
+
+    logger.info("[API] Result status: %s", result["status"])
 
+    # Format kết quả cho frontend
+    formatted_result = fact_checker_instance.format_result_for_frontend(result)
 
-@app.post("/api/check", response_model=FactCheckResponse, tags=["Core"])
+    # Chỉ cache kết quả thành công; lỗi crawl/tìm kiếm có thể chỉ là tạm thời
+    if response_cache is not None and formatted_result.get("success"):
+        response_cache[cache_key] = formatted_result
+    return formatted_result
+
+
+@app.post(
+    "/api/check",
+    response_model=FactCheckResponse,
+    response_class=ORJSONResponse,
+    tags=["Core"],
+)
 async def check_fact(request: FactCheckRequest):
+    # Kiểm tra sẵn sàng nằm ngoài try để 503 không bị except chung đổi thành 500
+    if fact_checker_instance is None:
+        raise HTTPException(status_code=503, detail="Fact checker chưa được khởi tạo")
+
     try:
-        if fact_checker_instance is None:
-            raise HTTPException(
-                status_code=503, detail="Fact checker chưa được khởi tạo"
-            )
-
-        print(f"\n{'='*60}")
-        print("[API] New request:")
-        print(f"  Type: {request.input_type}")
-        print(f"  Content: {request.content[:100]}...")
-        print(f"{'='*60}\n")
-
-        # Chạy pipeline kiểm tra
-        result = fact_checker_instance.check_fact(
-            user_input=request.content,
-            input_type=request.input_type,
-            num_sources=request.num_sources,
+        logger.info(
+            "[API] New request type=%s content=%.100s",
+            request.input_type,
+            request.content,
         )
 
-        print(f"\n[API] Result status: {result['status']}")
+        cache_key = hashlib.blake2b(
+            f"{request.input_type}|{request.num_sources}|{request.content}".encode(),
+            digest_size=16,
+        ).hexdigest()
+        if response_cache is not None and cache_key in response_cache:
+            logger.info("[API] Response cache HIT")
+            return ORJSONResponse(content=response_cache[cache_key])
 
-        # Format kết quả cho frontend
-        formatted_result = fact_checker_instance.format_result_for_frontend(result)
+        # Single-flight: các request giống hệt nhau đang chạy dùng chung một task
+        task = _inflight_checks.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(_run_check(request, cache_key))
+            _inflight_checks[cache_key] = task
+            task.add_done_callback(lambda _: _inflight_checks.pop(cache_key, None))
+        formatted_result = await asyncio.shield(task)
 
-        return JSONResponse(content=formatted_result)
+        return ORJSONResponse(content=formatted_result)
 
     except ValueError as e:
         # Lỗi 400 cho các vấn đề validation (ví dụ: text quá ngắn)
-        print(f"[API] ValueError: {str(e)}")
+        logger.warning("[API] ValueError: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         # Lỗi 500 cho các lỗi server nội bộ
-        print(f"[API] Exception: {type(e).__name__} - {str(e)}")
-        traceback.print_exc()
+        logger.exception("[API] Exception: %s - %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=f"Lỗi xử lý nội bộ: {str(e)}")
 
 
@@ -158,7 +305,7 @@ async def get_trusted_sources():
 
 @app.exception_handler(404)
 async def not_found_handler(request, exc):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=404,
         content={
             "success": False,
@@ -170,7 +317,7 @@ async def not_found_handler(request, exc):
 
 @app.exception_handler(500)
 async def internal_error_handler(request, exc):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "success": False,
@@ -183,5 +330,18 @@ async def internal_error_handler(request, exc):
 # --- Điểm vào (Entry Point) ---
 
 if __name__ == "__main__":
+    # Kiểm tra cấu hình một lần trước khi uvicorn tạo các worker
+    logging.basicConfig(level=Config.LOG_LEVEL)
+    Config.validate()
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run("api:app", host="0.0.0.0", port=port, reload=False, log_level="info")
+    uvicorn.run(
+        "api:app",
+        host="0.0.0.0",
+        port=port,
+        reload=False,
+        workers=Config.API_WORKERS,
+        loop="uvloop",
+        http="httptools",
+        log_level="info",
+        access_log=False,
+    )
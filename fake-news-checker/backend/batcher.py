@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveBatcher:
+    """Gom các yêu cầu đến trong một khoảng thời gian ngắn thành một lô."""
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch_size: int = 8,
+        max_wait_ms: int = 75,
+    ):
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._collector: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+
+    def start(self):
+        self._collector = asyncio.create_task(self._collect_forever())
+        logger.info(
+            f"Batcher started (max_batch_size={self.max_batch_size}, "
+            f"max_wait={self.max_wait * 1000:.0f}ms)"
+        )
+
+    async def stop(self):
+        if self._collector:
+            self._collector.cancel()
+            await asyncio.gather(self._collector, return_exceptions=True)
+        await asyncio.gather(*self._inflight, return_exceptions=True)
+
+        # Hủy các yêu cầu còn nằm trong hàng đợi
+        while not self.queue.empty():
+            _, future = self.queue.get_nowait()
+            if not future.done():
+                future.cancel()
+
+    async def submit(self, item: Any) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def _collect_forever(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Xử lý lô trong task riêng để tiếp tục gom lô kế tiếp
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        logger.info(f"Dispatching batch of {len(batch)} request(s)")
+        try:
+            outputs = await self.handler([item for item, _ in batch])
+        except Exception as e:
+            logger.error(f"Batch handler failed: {e}", exc_info=True)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), output in zip(batch, outputs):
+            if not future.done():
+                future.set_result(output)
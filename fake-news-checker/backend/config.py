@@ -1,3 +1,4 @@
+import logging
 import os
 from typing import Dict, Any, List
 
@@ -5,6 +6,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 class Config:
 
@@ -16,15 +19,32 @@ class Config:
     # --- Cấu hình Cache ---
     ENABLE_CACHE = os.getenv("ENABLE_CACHE", "true").lower() == "true"
     CACHE_TTL_HOURS = int(os.getenv("CACHE_TTL_HOURS", "24"))
+    # Thư mục cache embedding của bài tham khảo (dùng chung giữa các worker)
+    EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", ".cache/embeddings")
+    # Thư mục cache nội dung bài báo đã trích xuất theo URL
+    CRAWL_CACHE_PATH = os.getenv("CRAWL_CACHE_PATH", ".cache/extractions")
+    CRAWL_CACHE_TTL_HOURS = int(os.getenv("CRAWL_CACHE_TTL_HOURS", "6"))
 
     # --- Cấu hình logic tìm kiếm ---
     DEFAULT_NUM_RESULTS = int(os.getenv("DEFAULT_NUM_RESULTS", "5"))
     MAX_NUM_RESULTS = int(os.getenv("MAX_NUM_RESULTS", "10"))
 
+    # --- Cấu hình gom lô (micro-batching) cho /api/check ---
+    BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+    BATCH_MAX_WAIT_MS = int(os.getenv("BATCH_MAX_WAIT_MS", "75"))
+
     # --- Cấu hình mô hình AI ---
     SIMILARITY_MODEL = os.getenv(
         "SIMILARITY_MODEL", "bkai-foundation-models/vietnamese-bi-encoder"
     )
+    SIMILARITY_MAX_SEQ_LENGTH = int(os.getenv("SIMILARITY_MAX_SEQ_LENGTH", "256"))
+    SIMILARITY_MAX_CHARS = int(os.getenv("SIMILARITY_MAX_CHARS", "2000"))
+    # Số câu mỗi lượt forward khi encode (tăng nếu GPU còn dư bộ nhớ)
+    SIMILARITY_BATCH_SIZE = int(os.getenv("SIMILARITY_BATCH_SIZE", "64"))
+    # auto | fp32 | fp16 (chỉ GPU) | int8 (chỉ CPU)
+    SIMILARITY_PRECISION = os.getenv("SIMILARITY_PRECISION", "auto").lower()
+    # torch | onnx | openvino (onnx/openvino cần cài thêm optimum)
+    SIMILARITY_BACKEND = os.getenv("SIMILARITY_BACKEND", "torch").lower()
 
     VERDICT_THRESHOLDS: Dict[str, float] = {
         "HIGHLY_LIKELY_TRUE": 0.85,
@@ -38,6 +58,12 @@ class Config:
     API_HOST = os.getenv("API_HOST", "0.0.0.0")
     API_PORT = int(os.getenv("API_PORT", "8000"))
     API_RELOAD = os.getenv("API_RELOAD", "false").lower() == "true"
+    # Mỗi worker nạp riêng PhoBERT và model similarity (~1 GB RAM, hoặc VRAM nếu
+    # chạy GPU, cho mỗi worker); file model dùng chung cache trên đĩa (HF_HOME).
+    # Số luồng torch và process pool phân tích HTML của mỗi worker được chia
+    # theo giá trị này, nên khi chạy `uvicorn api:app --workers N` phải đặt
+    # API_WORKERS=N
+    API_WORKERS = int(os.getenv("API_WORKERS", "2"))
 
     CORS_ORIGINS: List[str] = os.getenv("CORS_ORIGINS", "*").split(",")
 
@@ -46,33 +72,41 @@ class Config:
 
     @classmethod
     def validate(cls):
-        print("\n" + "=" * 70)
-        print(" CONFIGURATION STATUS")
-        print("=" * 70)
+        # Chỉ ghi log một lần: api.py gọi hàm này trong tiến trình chính trước
+        # khi uvicorn tạo worker, các worker kế thừa biến môi trường này nên
+        # lần gọi trong lifespan của chúng không ghi lại
+        if os.environ.get("CONFIG_VALIDATED") == "1":
+            return True
+
+        lines = ["=" * 70, " CONFIGURATION STATUS", "=" * 70]
 
         # [Logic đã cập nhật] Kiểm tra xem Google API (chiến lược duy nhất)
         if cls.GOOGLE_API_KEY and cls.GOOGLE_CSE_ID:
-            print(" Google Custom Search API: CONFIGURED")
-            print("   → Will use Google API for searching (RECOMMENDED)")
+            lines.append(" Google Custom Search API: CONFIGURED")
+            lines.append("   → Will use Google API for searching (RECOMMENDED)")
         else:
             # Nếu không có API, web_searcher.py sẽ không hoạt động
-            print(" Google Custom Search API: NOT CONFIGURED")
-            print("   → ERROR: Search functionality will NOT work.")
-            print("   → Please set GOOGLE_API_KEY and GOOGLE_CSE_ID in .env file.")
+            lines.append(" Google Custom Search API: NOT CONFIGURED")
+            lines.append("   → ERROR: Search functionality will NOT work.")
+            lines.append(
+                "   → Please set GOOGLE_API_KEY and GOOGLE_CSE_ID in .env file."
+            )
 
         if cls.NEWS_API_KEY:
-            print(" NewsAPI: CONFIGURED")
+            lines.append(" NewsAPI: CONFIGURED")
         else:
-            print("   NewsAPI: NOT CONFIGURED (optional)")
+            lines.append("   NewsAPI: NOT CONFIGURED (optional)")
 
-        print(f"\n Cache: {'ENABLED' if cls.ENABLE_CACHE else 'DISABLED'}")
-        print(f" Cache TTL: {cls.CACHE_TTL_HOURS} hours")
-        print(f" Default results: {cls.DEFAULT_NUM_RESULTS}")
-        print(f" Similarity model: {cls.SIMILARITY_MODEL}")
-        print(f" API Server: {cls.API_HOST}:{cls.API_PORT}")
-        print("=" * 70 + "\n")
-
-        return True
+        lines.append(f" Cache: {'ENABLED' if cls.ENABLE_CACHE else 'DISABLED'}")
+        lines.append(f" Cache TTL: {cls.CACHE_TTL_HOURS} hours")
+        lines.append(f" Default results: {cls.DEFAULT_NUM_RESULTS}")
+        lines.append(
+            f" Similarity model: {cls.SIMILARITY_MODEL} ({cls.SIMILARITY_BACKEND})"
+        )
+        lines.append(f" API Server: {cls.API_HOST}:{cls.API_PORT}")
+        lines.append("=" * 70)
 
+        logger.info("\n" + "\n".join(lines))
+        os.environ["CONFIG_VALIDATED"] = "1"
 
-Config.validate()
+        return True
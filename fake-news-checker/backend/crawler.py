@@ -1,92 +1,280 @@
+import asyncio
 import logging
 import random
 import re
 import time
-from typing import Dict, Optional
+from collections import defaultdict, deque
+from concurrent.futures import Executor
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 from urllib.parse import quote_plus, urlparse
 
-import requests
-from bs4 import BeautifulSoup, element
-from curl_cffi import requests as cffi_requests
+import httpx
+from bs4 import BeautifulSoup, SoupStrainer, element
+from cachetools import TTLCache
+from curl_cffi.requests import AsyncSession
 
-from text_utils import normalize_text
+from text_utils import normalize_text, normalize_url
+
+try:
+    from diskcache import Cache
+
+    DISKCACHE_AVAILABLE = True
+except ImportError:
+    DISKCACHE_AVAILABLE = False
+    logging.warning("diskcache not available. Extraction disk cache is disabled.")
 
 logger = logging.getLogger(__name__)
 
 
 class Crawler:
 
-    def __init__(self):
+    # Số giây chờ trước khi khởi động chiến lược dự phòng kế tiếp
+    HEDGE_DELAY = 1.5
+    # Số request đồng thời tối đa tới cùng một domain (tránh bị 429/503)
+    MAX_CONCURRENT_PER_DOMAIN = 4
+    # Số URL được trích xuất đồng thời trên toàn bộ Crawler
+    MAX_CONCURRENT_URLS = 16
+    # Số byte HTML tối đa được tải cho mỗi trang
+    MAX_HTML_BYTES = 512 * 1024
+    # Tạm bỏ chiến lược 3 khi Google trả 429 quá số lần này trong 1 phút
+    SNIPPET_MAX_429_PER_MINUTE = 3
+
+    _NOISE_TAGS = ["script", "style", "iframe", "noscript", "nav", "footer", "header"]
+    # Thẻ nhiễu cũng phải được dựng (rồi decompose), nếu không các <div>/<p>
+    # nằm trong <nav>/<footer> sẽ bị strainer giữ lại như nội dung thường
+    _CONTENT_STRAINER = SoupStrainer(
+        ["article", "div", "p", "h1", "title", "meta", *_NOISE_TAGS]
+    )
+    # Lúc parse, SoupStrainer thấy thuộc tính class ở dạng chuỗi thô
+    # (vd. "g tF2Cxc") nên phải so khớp theo từ bằng regex
+    _SERP_STRAINER = SoupStrainer("div", class_=re.compile(r"(?:^|\s)g(?:\s|$)"))
+
+    # Các mẫu URL thường là trang danh mục, không phải bài báo
+    _INVALID_URL_RE = re.compile(
+        r"/(?:topic|category|tag|video|podcast|page|chu-de|folder|gallery|photo)/"
+        r"|/(?:search|tim-kiem)",
+        re.I,
+    )
+    _DIGIT_RE = re.compile(r"\d")
+
+    # Các regex dùng khi trích xuất, biên dịch một lần khi nạp class
+    _CONTENT_CLASS_RE = re.compile(
+        r"(content|article|body|detail|story|entry|post)", re.I
+    )
+    _SNIPPET_CLASS_RE = re.compile("VwiC3b|s3v9rd")
+    _THANHNIEN_CLASS_RE = re.compile("content|detail|body", re.I)
+    _DANTRI_CLASS_RE = re.compile("detail|content", re.I)
+    _VIETNAMNET_CLASS_RE = re.compile("main-content|article-content", re.I)
+
+    def __init__(
+        self,
+        http_client: Optional[httpx.AsyncClient] = None,
+        cache_enabled: bool = True,
+        cache_ttl_hours: int = 24,
+        process_pool: Optional[Executor] = None,
+        disk_cache_path: Optional[str] = None,
+        disk_cache_ttl_hours: int = 6,
+    ):
         """Khởi tạo Crawler."""
         logger.info("Crawler initialized")
+        self.process_pool = process_pool
+        # Cache kết quả trích xuất theo URL (đã chuẩn hóa)
+        self.cache = (
+            TTLCache(maxsize=2048, ttl=cache_ttl_hours * 3600)
+            if cache_enabled
+            else None
+        )
+        # Tầng cache thứ hai trên đĩa: dùng chung giữa các worker và còn
+        # nguyên sau khi khởi động lại
+        self.disk_cache = (
+            Cache(disk_cache_path, size_limit=2**30)
+            if cache_enabled and disk_cache_path and DISKCACHE_AVAILABLE
+            else None
+        )
+        self.disk_cache_ttl = disk_cache_ttl_hours * 3600
+        # Client dùng chung (tạo trong lifespan của API); tự tạo nếu chạy độc lập
+        self._owns_http_client = http_client is None
+        self.http_client = http_client or httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+        # Session curl_cffi giữ kết nối (keep-alive) giữa các lượt tải; tạo
+        # lười vì AsyncSession cần event loop đang chạy
+        self._cffi_session: Optional[AsyncSession] = None
+        self._snippet_429s: Deque[float] = deque()
+        self._domain_sems: Dict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(self.MAX_CONCURRENT_PER_DOMAIN)
+        )
+        self._url_sem = asyncio.Semaphore(self.MAX_CONCURRENT_URLS)
         self.user_agents = [
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0",
         ]
-        # Các mẫu URL thường là trang danh mục, không phải bài báo
-        self.invalid_patterns = [
-            "/topic/",
-            "/category/",
-            "/tag/",
-            "/search",
-            "/tim-kiem",
-            "/video/",
-            "/podcast/",
-            "/page/",
-            "/chu-de/",
-            "/folder/",
-            "/gallery/",
-            "/photo/",
-        ]
 
     def is_valid_article_url(self, url: str) -> bool:
         try:
-            has_number = any(char.isdigit() for char in url)
-            is_not_category = not any(
-                pattern in url.lower() for pattern in self.invalid_patterns
-            )
-            url_path = url.split("/")[-1]
-            has_sufficient_length = len(url_path) > 15
-            return has_number and is_not_category and has_sufficient_length
+            if not self._DIGIT_RE.search(url):
+                return False
+            if self._INVALID_URL_RE.search(url):
+                return False
+            url_path = url.rsplit("/", 1)[-1]
+            return len(url_path) > 15
         except Exception:
             # Nếu URL có định dạng quá tệ (ví dụ: không phải string), trả về False
             return False
 
-    def extract_from_url(self, url: str) -> Optional[Dict[str, str]]:
+    async def aclose(self):
+        if self._cffi_session is not None:
+            await self._cffi_session.close()
+            self._cffi_session = None
+        if self._owns_http_client:
+            await self.http_client.aclose()
+        if self.disk_cache is not None:
+            self.disk_cache.close()
+
+    def _get_cffi_session(self) -> AsyncSession:
+        if self._cffi_session is None:
+            self._cffi_session = AsyncSession(
+                impersonate="chrome120",  # Giả mạo Chrome 120 để vượt qua bot detection
+                timeout=30,
+                verify=True,
+                # Mặc định curl_cffi chỉ có 10 handle: đủ cho số URL đồng thời
+                max_clients=self.MAX_CONCURRENT_URLS,
+            )
+        return self._cffi_session
+
+    async def extract_from_urls(
+        self, urls: List[str]
+    ) -> List[Union[Optional[Dict[str, str]], BaseException]]:
+        """Trích xuất nhiều URL song song; lỗi của từng URL được trả về tại chỗ."""
+        return await asyncio.gather(
+            *(self._extract_limited(url) for url in urls), return_exceptions=True
+        )
+
+    async def _extract_limited(self, url: str) -> Optional[Dict[str, str]]:
+        # Kết quả tìm kiếm là trang danh mục/tag chứ không phải bài báo: bỏ qua,
+        # không tốn request nào (chỉ áp dụng cho bài tham khảo)
         if not self.is_valid_article_url(url):
-            logger.warning(f"URL may not be a valid article: {url}")
-
-        # Chiến lược 1: Thử trực tiếp bằng curl_cffi (giả mạo trình duyệt)
-        result = self._try_requests_method(url)
-        if result:
-            return result
+            logger.warning(f"Skipping URL, not a valid article: {url}")
+            return None
+        async with self._url_sem:
+            return await self.extract_from_url(url)
 
-        # Chiến lược 2: Thử qua proxy của archive.org (nếu trang gốc bị lỗi 404/503)
-        logger.warning("Method 1 failed, trying archive.org proxy...")
-        result = self._try_archive_method(url)
-        if result:
-            return result
+    async def extract_from_url(self, url: str) -> Optional[Dict[str, str]]:
+        # URL do người dùng gửi vẫn được crawl, chỉ cảnh báo
+        if not self.is_valid_article_url(url):
+            logger.warning(f"URL may not be a valid article: {url}")
 
-        # Chiến lược 3: Thử lấy snippet (đoạn trích) từ Google Search
-        logger.warning("Method 2 failed, trying search snippet extraction...")
-        result = self._try_search_snippet_method(url)
+        cache_key = normalize_url(url)
+        if self.cache is not None and cache_key in self.cache:
+            logger.info(f"Extraction cache HIT: {url}")
+            return self.cache[cache_key]
+        # Đọc/ghi SQLite của diskcache có thể bị khóa khi nhiều worker cùng
+        # ghi, nên chạy trong threadpool để không chặn event loop
+        if self.disk_cache is not None:
+            result = await asyncio.to_thread(self.disk_cache.get, cache_key)
+            if result is not None:
+                logger.info(f"Extraction disk cache HIT: {url}")
+                if self.cache is not None:
+                    self.cache[cache_key] = result
+                return result
+
+        result = await self._extract_uncached(url, urlparse(url).netloc)
         if result:
-            return result
+            if self.cache is not None:
+                self.cache[cache_key] = result
+            if self.disk_cache is not None:
+                await asyncio.to_thread(
+                    self.disk_cache.set,
+                    cache_key,
+                    result,
+                    expire=self.disk_cache_ttl,
+                    tag="url",
+                )
+        return result
 
-        logger.error(f"All extraction methods failed for: {url}")
-        return None
+    async def _extract_uncached(
+        self, url: str, domain: str
+    ) -> Optional[Dict[str, str]]:
+        # Chạy đua 3 chiến lược, lấy kết quả thành công đầu tiên.
+        # Chiến lược 2, 3 được khởi động trễ (hedged request) để không tốn
+        # lượt gọi archive.org/Google khi tải trực tiếp đã đủ nhanh.
+        # Snippet Google (chiến lược 3) chỉ là đoạn trích ngắn nên chỉ được
+        # dùng khi cả chiến lược 1 và 2 đều đã thất bại.
+        tasks = {
+            # Chiến lược 1: Thử trực tiếp bằng curl_cffi (giả mạo trình duyệt)
+            asyncio.create_task(self._try_requests_method(url, domain)): 0,
+            # Chiến lược 2: Thử qua proxy của archive.org (nếu trang gốc bị lỗi 404/503)
+            asyncio.create_task(
+                self._hedged(self._try_archive_method, url, domain, self.HEDGE_DELAY)
+            ): 1,
+            # Chiến lược 3: Thử lấy snippet (đoạn trích) từ Google Search
+            asyncio.create_task(
+                self._hedged(
+                    self._try_search_snippet_method, url, domain, 2 * self.HEDGE_DELAY
+                )
+            ): 2,
+        }
+        pending = set(tasks)
+        snippet_result: Optional[Dict[str, str]] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                # Nếu nhiều chiến lược xong cùng lúc, ưu tiên theo thứ tự 1 → 3
+                for task in sorted(done, key=tasks.get):
+                    if task.exception():
+                        logger.warning(
+                            f"Method {tasks[task] + 1} raised: {task.exception()}"
+                        )
+                        continue
+                    result = task.result()
+                    if result and tasks[task] < 2:
+                        return result
+                    if result:
+                        # Giữ lại, chờ chiến lược 1 và 2 xong hẳn
+                        snippet_result = result
+                        continue
+                    logger.warning(f"Method {tasks[task] + 1} failed for: {url}")
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if snippet_result is None:
+            logger.error(f"All extraction methods failed for: {url}")
+        return snippet_result
+
+    async def _hedged(
+        self,
+        method: Callable[[str, str], Awaitable[Optional[Dict[str, str]]]],
+        url: str,
+        domain: str,
+        delay: float,
+    ) -> Optional[Dict[str, str]]:
+        await asyncio.sleep(delay)
+        return await method(url, domain)
 
-    def _try_requests_method(
-        self, url: str, max_retries: int = 3
+    async def _try_requests_method(
+        self, url: str, domain: str, max_retries: int = 3
     ) -> Optional[Dict[str, str]]:
         headers = {
             "User-Agent": random.choice(self.user_agents),
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
             "Accept-Language": "vi-VN,vi;q=0.9,en-US;q=0.8,en;q=0.7",
         }
-        domain = urlparse(url).netloc
         if "vnexpress.net" in domain:
             headers["Referer"] = "https://www.google.com/search?q=vnexpress"
 
@@ -95,119 +283,125 @@ class Crawler:
                 logger.info(
                     f"Attempt {attempt + 1}/{max_retries}: Extracting from {url} using curl_cffi"
                 )
-                response = cffi_requests.get(
-                    url,
-                    headers=headers,
-                    timeout=30,
-                    allow_redirects=True,
-                    verify=True,
-                    impersonate="chrome120",  # Giả mạo Chrome 120 để vượt qua bot detection
-                )
+                status_code, html = await self._fetch_html(url, domain, headers)
 
-                if response.status_code == 200:
-                    # Phân tích HTML nếu tải thành công
-                    soup = BeautifulSoup(response.content, "html.parser")
-
-                    # Dọn dẹp các thẻ không chứa nội dung
-                    for tag in soup(
-                        [
-                            "script",
-                            "style",
-                            "iframe",
-                            "noscript",
-                            "nav",
-                            "footer",
-                            "header",
-                        ]
-                    ):
-                        tag.decompose()
-
-                    title = self._extract_title(soup)
-                    description = self._extract_description(soup)
-                    content = self._extract_content(soup, url)
-
-                    if content and len(content) > 100:
+                if html is not None:
+                    result = await self._parse_to_result(html, url, domain)
+                    if result:
                         logger.info(
-                            f"Successfully extracted {len(content)} characters (via curl_cffi)"
+                            f"Successfully extracted {len(result['content'])} characters (via curl_cffi)"
                         )
-                        return {
-                            "title": normalize_text(title),
-                            "description": normalize_text(description),
-                            "content": normalize_text(content),
-                            "url": url,
-                            "domain": domain,
-                        }
+                        return result
 
-                logger.warning(
-                    f"Attempt {attempt + 1} failed: Status {response.status_code}"
-                )
+                logger.warning(f"Attempt {attempt + 1} failed: Status {status_code}")
 
             except Exception as e:
                 logger.warning(f"Attempt {attempt + 1} failed: {str(e)}")
 
             if attempt < max_retries - 1:
                 # Chờ một khoảng ngẫu nhiên trước khi thử lại
-                time.sleep(random.uniform(2, 5))
+                await asyncio.sleep(random.uniform(2, 5))
 
         return None
 
-    def _try_archive_method(self, url: str) -> Optional[Dict[str, str]]:
+    async def _fetch_html(
+        self, url: str, domain: str, headers: Dict[str, str]
+    ) -> Tuple[int, Optional[bytes]]:
+        # Chỉ tải HTML (I/O); việc phân tích do _parse_to_result đảm nhận
+        async with self._domain_sems[domain]:
+            response = await self._get_cffi_session().get(
+                url, headers=headers, allow_redirects=True, stream=True
+            )
+            try:
+                if response.status_code != 200:
+                    return response.status_code, None
+                return 200, await self._read_capped(response.aiter_content())
+            finally:
+                await response.aclose()
+
+    async def _fetch_archive_html(self, url: str) -> Optional[bytes]:
+        archive_api = f"http://archive.org/wayback/available?url={url}"
+        response = await self.http_client.get(
+            archive_api, timeout=10, follow_redirects=True
+        )
+        data = response.json()
+
+        if (
+            "archived_snapshots" not in data
+            or "closest" not in data["archived_snapshots"]
+        ):
+            return None
+        archive_url = data["archived_snapshots"]["closest"]["url"]
+        logger.info(f"Found archive.org snapshot: {archive_url}")
+
+        async with self.http_client.stream(
+            "GET", archive_url, timeout=30, follow_redirects=True
+        ) as archive_response:
+            if archive_response.status_code != 200:
+                return None
+            return await self._read_capped(archive_response.aiter_bytes())
+
+    async def _try_archive_method(
+        self, url: str, domain: str
+    ) -> Optional[Dict[str, str]]:
         try:
-            archive_api = f"http://archive.org/wayback/available?url={url}"
-            response = requests.get(archive_api, timeout=10)
-            data = response.json()
-
-            if "archived_snapshots" in data and "closest" in data["archived_snapshots"]:
-                archive_url = data["archived_snapshots"]["closest"]["url"]
-                logger.info(f"Found archive.org snapshot: {archive_url}")
-
-                archive_response = requests.get(archive_url, timeout=30)
-                if archive_response.status_code == 200:
-                    soup = BeautifulSoup(archive_response.content, "html.parser")
-                    for tag in soup(
-                        [
-                            "script",
-                            "style",
-                            "iframe",
-                            "noscript",
-                            "nav",
-                            "footer",
-                            "header",
-                        ]
-                    ):
-                        tag.decompose()
-
-                    title = self._extract_title(soup)
-                    description = self._extract_description(soup)
-                    content = self._extract_content(soup, url)
-
-                    if content and len(content) > 100:
-                        logger.info(
-                            f"Archive.org extraction successful: {len(content)} chars"
-                        )
-                        return {
-                            "title": normalize_text(title),
-                            "description": normalize_text(description),
-                            "content": normalize_text(content),
-                            "url": url,
-                            "domain": urlparse(url).netloc,
-                        }
+            html = await self._fetch_archive_html(url)
+            if html:
+                result = await self._parse_to_result(html, url, domain)
+                if result:
+                    logger.info(
+                        f"Archive.org extraction successful: {len(result['content'])} chars"
+                    )
+                    return result
         except Exception as e:
             logger.warning(f"Archive.org method failed: {str(e)}")
 
         return None
 
-    def _try_search_snippet_method(self, url: str) -> Optional[Dict[str, str]]:
+    async def _parse_to_result(
+        self, html: bytes, url: str, domain: str
+    ) -> Optional[Dict[str, str]]:
+        title, description, content = await self._parse_off_loop(html, domain)
+        if not content or len(content) <= 100:
+            return None
+        return {
+            "title": normalize_text(title),
+            "description": normalize_text(description),
+            "content": normalize_text(content),
+            "url": url,
+            "domain": domain,
+        }
+
+    def _snippet_rate_limited(self) -> bool:
+        now = time.monotonic()
+        while self._snippet_429s and now - self._snippet_429s[0] > 60:
+            self._snippet_429s.popleft()
+        return len(self._snippet_429s) >= self.SNIPPET_MAX_429_PER_MINUTE
+
+    async def _try_search_snippet_method(
+        self, url: str, domain: str
+    ) -> Optional[Dict[str, str]]:
+        if self._snippet_rate_limited():
+            logger.warning("Google is rate limiting us, skipping snippet method")
+            return None
+
         try:
-            search_query = (
-                f"site:{urlparse(url).netloc} {url.split('/')[-1].replace('-', ' ')}"
-            )
+            search_query = f"site:{domain} {url.rsplit('/', 1)[-1].replace('-', ' ')}"
             search_url = f"https://www.google.com/search?q={quote_plus(search_query)}"
 
             headers = {"User-Agent": random.choice(self.user_agents)}
 
-            response = requests.get(search_url, headers=headers, timeout=10)
-            soup = BeautifulSoup(response.content, "html.parser")
+            response = await self.http_client.get(
+                search_url, headers=headers, timeout=10, follow_redirects=True
+            )
+            if response.status_code == 429:
+                self._snippet_429s.append(time.monotonic())
+                logger.warning("Search snippet method got 429 from Google")
+                return None
+            # Chỉ dựng cây cho các khối kết quả tìm kiếm (div.g)
+            soup = BeautifulSoup(
+                response.content, "lxml", parse_only=self._SERP_STRAINER
+            )
 
             search_divs = soup.find_all("div", class_="g")
             for div in search_divs:
@@ -217,7 +411,7 @@ class Crawler:
                     title = title_elem.get_text(strip=True) if title_elem else ""
 
                     snippet_elem = div.find(
-                        ["div", "span"], class_=re.compile("VwiC3b|s3v9rd")
+                        ["div", "span"], class_=self._SNIPPET_CLASS_RE
                     )
                     snippet = snippet_elem.get_text(strip=True) if snippet_elem else ""
 
@@ -228,14 +422,44 @@ class Crawler:
                             "description": "",
                             "content": normalize_text(snippet),
                             "url": url,
-                            "domain": urlparse(url).netloc,
+                            "domain": domain,
                         }
         except Exception as e:
             logger.warning(f"Search snippet method failed: {str(e)}")
 
         return None
 
-    def _extract_title(self, soup: BeautifulSoup) -> str:
+    async def _read_capped(self, chunks: AsyncIterator[bytes]) -> bytes:
+        # Nội dung bài báo nằm ở phần đầu trang; phần sau thường là ảnh
+        # base64/script nên dừng đọc khi vượt MAX_HTML_BYTES
+        buffer = bytearray()
+        async for chunk in chunks:
+            buffer.extend(chunk)
+            if len(buffer) >= self.MAX_HTML_BYTES:
+                logger.info(f"HTML truncated at {self.MAX_HTML_BYTES} bytes")
+                break
+        return bytes(buffer[: self.MAX_HTML_BYTES])
+
+    async def _parse_off_loop(self, html: bytes, domain: str) -> Tuple[str, str, str]:
+        # Phân tích HTML tốn CPU: chạy trong process pool (hoặc threadpool
+        # mặc định nếu không có) để không chặn event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.process_pool, parse_and_extract, html, domain
+        )
+
+    @classmethod
+    def _parse_html(cls, html: bytes) -> BeautifulSoup:
+        # Parser lxml (C) và chỉ dựng cây cho các thẻ có thể chứa nội dung
+        soup = BeautifulSoup(html, "lxml", parse_only=cls._CONTENT_STRAINER)
+
+        # Xóa các thẻ nhiễu cùng toàn bộ nội dung bên trong (menu, footer...)
+        for tag in soup(cls._NOISE_TAGS):
+            tag.decompose()
+        return soup
+
+    @staticmethod
+    def _extract_title(soup: BeautifulSoup) -> str:
         title = ""
         title_tag = soup.find("title")
         if title_tag:
@@ -253,7 +477,8 @@ class Crawler:
 
         return title
 
-    def _extract_description(self, soup: BeautifulSoup) -> str:
+    @staticmethod
+    def _extract_description(soup: BeautifulSoup) -> str:
         description = ""
         meta_desc = soup.find("meta", attrs={"name": "description"})
         if not meta_desc:
@@ -264,38 +489,45 @@ class Crawler:
 
         return description
 
-    def _extract_paragraphs(self, element: element.Tag) -> str:
-        paragraphs = element.find_all("p")
-        texts = [
-            p.get_text(strip=True)
-            for p in paragraphs
-            if len(p.get_text(strip=True)) > 30  # Lọc các thẻ <p> rỗng hoặc quá ngắn
-        ]
-        return " ".join(texts)
-
-    def _extract_content(self, soup: BeautifulSoup, url: str) -> str:
+    @staticmethod
+    def _index_paragraphs(soup: BeautifulSoup) -> List[Tuple[str, Set[int]]]:
+        # Duyệt các thẻ <p> đúng một lần: mỗi thẻ chỉ gọi get_text một lần
+        # và ghi lại id các thẻ tổ tiên, để các vùng ứng viên (article, div
+        # nội dung, selector riêng) chỉ còn là phép lọc trên danh sách này
+        paragraphs = []
+        for p in soup.find_all("p"):
+            text = p.get_text(strip=True)
+            # Lọc các thẻ <p> rỗng hoặc quá ngắn
+            if len(text) > 30:
+                paragraphs.append((text, {id(parent) for parent in p.parents}))
+        return paragraphs
+
+    @staticmethod
+    def _extract_paragraphs(
+        paragraphs: List[Tuple[str, Set[int]]], element: element.Tag
+    ) -> str:
+        key = id(element)
+        return " ".join(text for text, ancestors in paragraphs if key in ancestors)
+
+    @classmethod
+    def _extract_content(cls, soup: BeautifulSoup, domain: str) -> str:
         content = ""
-        domain = urlparse(url).netloc
+        paragraphs = cls._index_paragraphs(soup)
 
         # 1. Thử tìm thẻ <article>
         article = soup.find("article")
         if article:
-            content = self._extract_paragraphs(article)
+            content = cls._extract_paragraphs(paragraphs, article)
             if len(content) > 200:
                 logger.info(f"Content found in <article> tag: {len(content)} chars")
                 return content
 
         # 2. Thử tìm các class CSS phổ biến
         if not content or len(content) < 200:
-            content_divs = soup.find_all(
-                "div",
-                class_=re.compile(
-                    r"(content|article|body|detail|story|entry|post)", re.I
-                ),
-            )
+            content_divs = soup.find_all("div", class_=cls._CONTENT_CLASS_RE)
             best_content = ""
             for div in content_divs:
-                temp_content = self._extract_paragraphs(div)
+                temp_content = cls._extract_paragraphs(paragraphs, div)
                 if len(temp_content) > len(best_content):
                     best_content = temp_content
             content = best_content  # Cập nhật content ngay cả khi < 200
@@ -306,7 +538,7 @@ class Crawler:
 
         # 3. Thử theo bộ chọn (selector) cụ thể cho 5 trang báo
         if not content or len(content) < 200:
-            domain_content = self._extract_domain_specific(soup, domain)
+            domain_content = cls._extract_domain_specific(soup, domain, paragraphs)
             if len(domain_content) > len(content):
                 content = domain_content
                 if len(content) > 200:
@@ -317,18 +549,19 @@ class Crawler:
 
         # 4. Fallback: Lấy tất cả các thẻ <p>
         if not content or len(content) < 200:
-            paragraphs = soup.find_all("p")
-            texts = [
-                p.get_text(strip=True)
-                for p in paragraphs
-                if len(p.get_text(strip=True)) > 30
-            ]
-            content = " ".join(texts[:50])  # Lấy 50 đoạn đầu tiên
+            # Lấy 50 đoạn đầu tiên
+            content = " ".join(text for text, _ in paragraphs[:50])
             logger.info(f"Fallback extraction (all <p>): {len(content)} chars")
 
         return content
 
-    def _extract_domain_specific(self, soup: BeautifulSoup, domain: str) -> str:
+    @classmethod
+    def _extract_domain_specific(
+        cls,
+        soup: BeautifulSoup,
+        domain: str,
+        paragraphs: List[Tuple[str, Set[int]]],
+    ) -> str:
         content = ""
         element = None
         try:
@@ -337,18 +570,14 @@ class Crawler:
             elif "tuoitre.vn" in domain:
                 element = soup.find("div", id="main-detail-content")
             elif "thanhnien.vn" in domain:
-                element = soup.find(
-                    "div", class_=re.compile("content|detail|body", re.I)
-                )
+                element = soup.find("div", class_=cls._THANHNIEN_CLASS_RE)
             elif "dantri.com.vn" in domain:
-                element = soup.find("div", class_=re.compile("detail|content", re.I))
+                element = soup.find("div", class_=cls._DANTRI_CLASS_RE)
             elif "vietnamnet.vn" in domain:
-                element = soup.find(
-                    "div", class_=re.compile("main-content|article-content", re.I)
-                )
+                element = soup.find("div", class_=cls._VIETNAMNET_CLASS_RE)
 
             if element:
-                content = self._extract_paragraphs(element)
+                content = cls._extract_paragraphs(paragraphs, element)
                 logger.info(
                     f"Specific extractor for {domain} found: {len(content)} chars"
                 )
@@ -356,3 +585,16 @@ class Crawler:
             logger.warning(f"Error in domain specific extractor for {domain}: {e}")
 
         return content
+
+
+def parse_and_extract(html: bytes, domain: str) -> Tuple[str, str, str]:
+    """Phân tích HTML và trích xuất (title, description, content).
+
+    Là hàm cấp module để có thể gửi sang ProcessPoolExecutor.
+    """
+    soup = Crawler._parse_html(html)
+    return (
+        Crawler._extract_title(soup),
+        Crawler._extract_description(soup),
+        Crawler._extract_content(soup, domain),
+    )
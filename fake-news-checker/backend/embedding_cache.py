@@ -0,0 +1,49 @@
+import hashlib
+import logging
+from typing import Optional
+
+import numpy as np
+
+try:
+    from diskcache import Cache
+
+    DISKCACHE_AVAILABLE = True
+except ImportError:
+    DISKCACHE_AVAILABLE = False
+    logging.warning("diskcache not available. Embedding cache is disabled.")
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """Cache embedding của bài tham khảo trên đĩa, dùng chung giữa các worker."""
+
+    def __init__(self, path: str, namespace: str = "", ttl_hours: int = 24):
+        self.namespace = namespace
+        self.ttl = ttl_hours * 3600
+        self._cache = Cache(path) if DISKCACHE_AVAILABLE else None
+        if self._cache is not None:
+            logger.info(f"Embedding cache enabled at {path}")
+
+    def make_key(self, text: str) -> str:
+        # Key theo chính nội dung được encode: cùng một bài đăng lại ở nhiều
+        # URL vẫn trúng cache, bài được sửa thì tự động có key mới
+        return hashlib.sha256(f"{self.namespace}|{text}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        if self._cache is None:
+            return None
+        data = self._cache.get(key)
+        if data is None:
+            return None
+        return np.frombuffer(data, dtype=np.float16).astype(np.float32)
+
+    def set(self, key: str, vector: np.ndarray):
+        if self._cache is None:
+            return
+        # Lưu float16 để giảm một nửa dung lượng; cosine gần như không đổi
+        self._cache.set(key, vector.astype(np.float16).tobytes(), expire=self.ttl)
+
+    def close(self):
+        if self._cache is not None:
+            self._cache.close()
@@ -1,7 +1,11 @@
+import asyncio
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import re
+from concurrent.futures import Executor
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
 
 try:
     from config import Config
@@ -12,10 +16,22 @@ except ImportError:
         GOOGLE_CSE_ID = None
         NEWS_API_KEY = None
         ENABLE_CACHE = True
+        CACHE_TTL_HOURS = 24
+        EMBED_CACHE_PATH = ".cache/embeddings"
+        CRAWL_CACHE_PATH = ".cache/extractions"
+        CRAWL_CACHE_TTL_HOURS = 6
+        SIMILARITY_MODEL = "bkai-foundation-models/vietnamese-bi-encoder"
+        SIMILARITY_MAX_SEQ_LENGTH = 256
+        SIMILARITY_MAX_CHARS = 2000
+        SIMILARITY_BATCH_SIZE = 64
+        SIMILARITY_PRECISION = "auto"
+        SIMILARITY_BACKEND = "torch"
         DEFAULT_NUM_RESULTS = 5
 
 
 try:
+    from batcher import AdaptiveBatcher
+    from embedding_cache import EmbeddingCache
     from preprocessor import TextPreprocessor
     from similarity_checker import SimilarityChecker
     from web_searcher import WebSearcher
@@ -27,11 +43,27 @@ logger = logging.getLogger(__name__)
 
 
 class FactChecker:
+    REFUTATION_KEYWORDS = (
+        "bác bỏ",
+        "phủ nhận",
+        "đính chính",
+        "tin đồn",
+        "tin giả",
+        "sự thật",
+        "thực hư",
+        "giả mạo",
+        "vu khống",
+    )
+    # Quét tất cả từ khóa phủ định trong một lần duyệt tiêu đề
+    _REFUTE_RE = re.compile("|".join(map(re.escape, REFUTATION_KEYWORDS)))
+
     def __init__(
         self,
         google_api_key: Optional[str] = None,
         google_cse_id: Optional[str] = None,
         news_api_key: Optional[str] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+        process_pool: Optional[Executor] = None,
     ):
 
         logger.info("=" * 70)
@@ -40,128 +72,93 @@ class FactChecker:
         api_key = google_api_key or Config.GOOGLE_API_KEY
         cse_id = google_cse_id or Config.GOOGLE_CSE_ID
 
-        self.preprocessor = TextPreprocessor()
+        self.preprocessor = TextPreprocessor(
+            http_client=http_client,
+            cache_enabled=Config.ENABLE_CACHE,
+            cache_ttl_hours=Config.CACHE_TTL_HOURS,
+            process_pool=process_pool,
+            crawl_cache_path=Config.CRAWL_CACHE_PATH,
+            crawl_cache_ttl_hours=Config.CRAWL_CACHE_TTL_HOURS,
+        )
         logger.info("Preprocessor (and Crawler) initialized")
         self.searcher = WebSearcher(
             google_api_key=api_key,
             google_cse_id=cse_id,
             cache_enabled=Config.ENABLE_CACHE,
+            http_client=http_client,
         )
         logger.info(" Web Searcher initialized")
-        self.similarity_checker = SimilarityChecker()
+        self.similarity_checker = SimilarityChecker(
+            model_name=Config.SIMILARITY_MODEL,
+            max_seq_length=Config.SIMILARITY_MAX_SEQ_LENGTH,
+            max_chars=Config.SIMILARITY_MAX_CHARS,
+            batch_size=Config.SIMILARITY_BATCH_SIZE,
+            precision=Config.SIMILARITY_PRECISION,
+            backend=Config.SIMILARITY_BACKEND,
+        )
+        # Tạo cache sau khi nạp model để namespace dùng độ chính xác và backend
+        # thực tế (đã phân giải "auto", hoặc đã quay về torch khi lỗi)
+        self.embedding_cache = (
+            EmbeddingCache(
+                Config.EMBED_CACHE_PATH,
+                # Đổi model, độ dài chuỗi hoặc độ chính xác thì embedding cũ
+                # không còn dùng được
+                namespace=(
+                    f"{Config.SIMILARITY_MODEL}|{Config.SIMILARITY_MAX_SEQ_LENGTH}"
+                    f"|{self.similarity_checker.precision}"
+                    f"|{self.similarity_checker.backend}"
+                ),
+                ttl_hours=Config.CACHE_TTL_HOURS,
+            )
+            if Config.ENABLE_CACHE
+            else None
+        )
+        self.similarity_checker.embedding_cache = self.embedding_cache
         logger.info("Similarity Checker initialized")
+        # Chỉ gom lô ở các bước chạy model; bật bằng start_batching() khi đã
+        # có event loop (API), nếu không thì gọi model trực tiếp
+        self._keyword_batcher: Optional[AdaptiveBatcher] = None
+        self._similarity_batcher: Optional[AdaptiveBatcher] = None
         logger.info("=" * 70)
         logger.info(" Fact Checker ready!")
         logger.info("=" * 70 + "\n")
 
-    def check_fact(
+    def start_batching(self, max_batch_size: int = 8, max_wait_ms: int = 75):
+        # Mỗi yêu cầu chỉ chờ các yêu cầu khác trong lượt chạy model, không
+        # phải chờ lượt crawl chậm nhất của cả lô
+        self._keyword_batcher = AdaptiveBatcher(
+            self._preprocess_batch, max_batch_size, max_wait_ms
+        )
+        self._similarity_batcher = AdaptiveBatcher(
+            self._similarity_batch, max_batch_size, max_wait_ms
+        )
+        self._keyword_batcher.start()
+        self._similarity_batcher.start()
+
+    async def aclose(self):
+        for batcher in (self._keyword_batcher, self._similarity_batcher):
+            if batcher is not None:
+                await batcher.stop()
+        await self.preprocessor.crawler.aclose()
+        await self.searcher.aclose()
+        if self.embedding_cache is not None:
+            self.embedding_cache.close()
+
+    async def check_fact(
         self,
         user_input: str,
         input_type: str = "text",
         num_sources: Optional[int] = None,
     ) -> Dict[str, Any]:
         """ """
-        if num_sources is None:
-            num_sources = Config.DEFAULT_NUM_RESULTS
-        results = {
-            "timestamp": datetime.now().isoformat(),
-            "input_type": input_type,
-            "original_input": user_input,
-            "status": "processing",
-        }
+        results = self._new_results(user_input, input_type)
         try:
-            # --- BƯỚC 1: TIỀN XỬ LÝ ---
-            logger.info("\n" + "=" * 70)
-            logger.info("STEP 1: PREPROCESSING")
-            logger.info("=" * 70)
-            processed = self.preprocessor.process_input(user_input, input_type)
-            if not processed:
-                results["status"] = "error"
-                results["error"] = "Không thể xử lý input"
-                logger.error("Failed to preprocess input")
-                return results
-
-            if not processed["keywords"] and len(processed["full_text"]) < 15:
-                logger.warning(
-                    f"Input '{user_input}' quá ngắn hoặc không có ngữ nghĩa."
-                )
-                results["status"] = "input_too_short"
-                results["message"] = (
-                    "Nội dung quá ngắn hoặc không đủ ngữ nghĩa để phân tích. "
-                    "Vui lòng cung cấp thêm chi tiết."
-                )
-                return results
-
-            results["processed_data"] = {
-                "title": processed["title"],
-                "keywords": processed["keywords"],
-                "domain": processed["domain"],
-            }
-            logger.info(
-                f" Extracted {len(processed['keywords'])} keywords: {processed['keywords'][:10]}"
-            )
-
-            # --- BƯỚC 2: TÌM KIẾM ---
-            logger.info("\n" + "=" * 70)
-            logger.info("STEP 2: SEARCHING FOR REFERENCE ARTICLES")
-            logger.info("=" * 70)
-            reference_articles = self.searcher.search_for_fact_check(
-                processed, num_sources
+            gathered = await self._gather_references(
+                user_input, input_type, num_sources, results
             )
-            if not reference_articles:
-                results["status"] = "no_references"
-                results["message"] = "Không tìm thấy bài báo tham khảo từ nguồn uy tín"
-                logger.warning("No reference articles found")
+            if gathered is None:
                 return results
-            logger.info(f"Found {len(reference_articles)} reference articles")
-
-            logger.info(
-                f"Found {len(reference_articles)} articles to crawl (NO filtering)"
-            )
-
-            # --- BƯỚC 4: THU THẬP NỘI DUNG (Song song) ---
-            logger.info("\n" + "=" * 70)
-            logger.info("STEP 4: CRAWLING REFERENCE ARTICLES (PARALLEL)")
-            logger.info("=" * 70)
-            reference_contents = []
-            with ThreadPoolExecutor(max_workers=5) as executor:
-                future_to_article = {
-                    executor.submit(
-                        self.preprocessor._process_url, article["url"]
-                    ): article
-                    for article in reference_articles
-                }
-                for future in as_completed(future_to_article):
-                    article = future_to_article[future]
-                    try:
-                        content = future.result()
-                        if content and content["content"]:
-                            reference_contents.append(
-                                {
-                                    "url": article["url"],
-                                    "title": content["title"] or article["title"],
-                                    "content": content["content"],
-                                    "domain": content["domain"],
-                                    "snippet": article.get("snippet", ""),
-                                    "source": article.get("source", ""),
-                                }
-                            )
-                            logger.info(
-                                f"Success ({article['domain']}): {len(content['content'])} chars"
-                            )
-                        else:
-                            logger.warning(f"Failed to crawl: {article['url']}")
-                    except Exception as e:
-                        logger.error(f"Error crawling {article['url']}: {e}")
-
-            if not reference_contents:
-                results["status"] = "crawl_failed"
-                results["message"] = "Không thể crawl nội dung từ các bài báo tham khảo"
-                logger.error("All crawl attempts failed")
-                return results
-            logger.info(
-                f"Successfully crawled {len(reference_contents)}/{len(reference_articles)} articles"
-            )
+            processed, reference_contents = gathered
 
             # --- BƯỚC 5: TÍNH TOÁN TƯƠNG ĐỒNG (Batch) ---
             logger.info("\n" + "=" * 70)
@@ -175,104 +172,246 @@ class FactChecker:
             logger.info(
                 f"Running batch similarity for {len(reference_texts)} articles..."
             )
-            batch_results = self.similarity_checker.calculate_similarity_batch(
+            batch_results = await self._calculate_similarity(
                 text_to_compare, reference_texts
             )
-            similarity_results = []
-            for batch_item in batch_results:
-                original_index = batch_item["index"]
-                ref_metadata = reference_contents[original_index]
-                overall_sim = batch_item["similarity"]
-                similarity_results.append(
+            return self._build_verdict(results, reference_contents, batch_results)
+
+        except Exception as e:
+            return self._mark_error(results, e)
+
+    async def _preprocess(
+        self, user_input: str, input_type: str
+    ) -> Optional[Dict[str, Any]]:
+        if input_type == "text" and self._keyword_batcher is not None:
+            # Input text của các yêu cầu đồng thời dùng chung một lượt PhoBERT
+            return await self._keyword_batcher.submit(user_input)
+        return await self.preprocessor.process_input(user_input, input_type)
+
+    async def _preprocess_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
+        # Lượt forward PhoBERT chạy trong threadpool, không chặn event loop
+        return await asyncio.to_thread(self.preprocessor.process_texts, texts)
+
+    async def _calculate_similarity(
+        self, query_text: str, reference_texts: List[str]
+    ) -> List[Dict[str, Any]]:
+        if self._similarity_batcher is not None:
+            # Các yêu cầu đã crawl xong cùng lúc dùng chung một lượt encode
+            return await self._similarity_batcher.submit((query_text, reference_texts))
+        return await asyncio.to_thread(
+            self.similarity_checker.calculate_similarity_batch,
+            query_text,
+            reference_texts,
+        )
+
+    async def _similarity_batch(
+        self, items: List[Tuple[str, List[str]]]
+    ) -> List[List[Dict[str, Any]]]:
+        # Forward pass của bi-encoder và đọc/ghi cache trên đĩa chạy trong
+        # threadpool để không chặn event loop (các request khác, /health)
+        return await asyncio.to_thread(
+            self.similarity_checker.calculate_similarity_multi,
+            [query_text for query_text, _ in items],
+            [reference_texts for _, reference_texts in items],
+        )
+
+    def _new_results(self, user_input: str, input_type: str) -> Dict[str, Any]:
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "input_type": input_type,
+            "original_input": user_input,
+            "status": "processing",
+        }
+
+    def _mark_error(self, results: Dict[str, Any], e: Exception) -> Dict[str, Any]:
+        logger.error(f"Lỗi trong quá trình fact checking: {str(e)}", exc_info=e)
+        results["status"] = "error"
+        results["error"] = str(e)
+        return results
+
+    async def _gather_references(
+        self,
+        user_input: str,
+        input_type: str,
+        num_sources: Optional[int],
+        results: Dict[str, Any],
+    ) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """BƯỚC 1-4. Trả về None (và cập nhật results) nếu dừng sớm."""
+        if num_sources is None:
+            num_sources = Config.DEFAULT_NUM_RESULTS
+
+        # --- BƯỚC 1: TIỀN XỬ LÝ ---
+        logger.info("\n" + "=" * 70)
+        logger.info("STEP 1: PREPROCESSING")
+        logger.info("=" * 70)
+        processed = await self._preprocess(user_input, input_type)
+        if not processed:
+            results["status"] = "error"
+            results["error"] = "Không thể xử lý input"
+            logger.error("Failed to preprocess input")
+            return None
+
+        if not processed["keywords"] and len(processed["full_text"]) < 15:
+            logger.warning(f"Input '{user_input}' quá ngắn hoặc không có ngữ nghĩa.")
+            results["status"] = "input_too_short"
+            results["message"] = (
+                "Nội dung quá ngắn hoặc không đủ ngữ nghĩa để phân tích. "
+                "Vui lòng cung cấp thêm chi tiết."
+            )
+            return None
+
+        results["processed_data"] = {
+            "title": processed["title"],
+            "keywords": processed["keywords"],
+            "domain": processed["domain"],
+        }
+        logger.info(
+            f" Extracted {len(processed['keywords'])} keywords: {processed['keywords'][:10]}"
+        )
+
+        # --- BƯỚC 2: TÌM KIẾM ---
+        logger.info("\n" + "=" * 70)
+        logger.info("STEP 2: SEARCHING FOR REFERENCE ARTICLES")
+        logger.info("=" * 70)
+        reference_articles = await self.searcher.search_for_fact_check(
+            processed, num_sources
+        )
+        if not reference_articles:
+            results["status"] = "no_references"
+            results["message"] = "Không tìm thấy bài báo tham khảo từ nguồn uy tín"
+            logger.warning("No reference articles found")
+            return None
+        logger.info(f"Found {len(reference_articles)} reference articles")
+
+        logger.info(f"Found {len(reference_articles)} articles to crawl (NO filtering)")
+
+        # --- BƯỚC 4: THU THẬP NỘI DUNG (Song song) ---
+        logger.info("\n" + "=" * 70)
+        logger.info("STEP 4: CRAWLING REFERENCE ARTICLES (PARALLEL)")
+        logger.info("=" * 70)
+        reference_contents = []
+        crawl_results = await self._crawl_all(reference_articles)
+        # Gom chi tiết từng URL rồi ghi một dòng log tổng kết duy nhất
+        crawl_details = []
+        for article, content in zip(reference_articles, crawl_results):
+            if isinstance(content, Exception):
+                crawl_details.append((article["url"], f"error: {content}"))
+            elif content and content["content"]:
+                reference_contents.append(
                     {
-                        "url": ref_metadata["url"],
-                        "title": ref_metadata["title"],
-                        "domain": ref_metadata["domain"],
-                        "source": ref_metadata.get("source", ""),
-                        "overall_similarity": overall_sim,
-                        "detailed_similarity": None,
+                        "url": article["url"],
+                        "title": content["title"] or article["title"],
+                        "content": content["content"],
+                        "domain": content["domain"],
+                        "snippet": article.get("snippet", ""),
+                        "source": article.get("source", ""),
                     }
                 )
-                logger.info(f"{ref_metadata['domain']}: {overall_sim:.2%}")
-
-            # --- BƯỚC 6: ĐƯA RA KẾT LUẬN (Kiểm tra Phủ định & Lấy Max) ---
-            logger.info("\n" + "=" * 70)
-            logger.info("STEP 6: GENERATING VERDICT (REFUTATION CHECK & MAX)")
-            logger.info("=" * 70)
-
-            top_results = similarity_results[: min(3, len(similarity_results))]
-
-            refutation_keywords = [
-                "bác bỏ",
-                "phủ nhận",
-                "đính chính",
-                "tin đồn",
-                "tin giả",
-                "sự thật",
-                "thực hư",
-                "giả mạo",
-                "vu khống",
-            ]
-            final_scores = []
-
-            if not top_results:
-                highest_similarity = 0
-                top_scores = []
+                crawl_details.append(
+                    (article["url"], f"{len(content['content'])} chars")
+                )
             else:
-                for r in top_results:
-                    title_lower = r["title"].lower()
-                    score = r["overall_similarity"]
-                    if (
-                        any(keyword in title_lower for keyword in refutation_keywords)
-                        and score > 0.6
-                    ):
-                        logger.warning(f"Refutation detected: {r['title']}")
-                        final_scores.append(1.0 - score)  # Lật ngược điểm
-                    else:
-                        final_scores.append(score)
-
-                top_scores = sorted(final_scores, reverse=True)
-                highest_similarity = top_scores[0] if top_scores else 0
-
-            logger.info(f"Adjusted Top scores: {[f'{s:.2%}' for s in top_scores]}")
-            logger.info(
-                f"Calculated Adjusted Highest Similarity: {highest_similarity:.2%}"
-            )
+                crawl_details.append((article["url"], "failed"))
 
-            verdict = self.similarity_checker.generate_verdict(highest_similarity)
+        logger.info(
+            "Crawl summary: ok=%d fail=%d, details=%s",
+            len(reference_contents),
+            len(reference_articles) - len(reference_contents),
+            crawl_details,
+        )
+        if not reference_contents:
+            results["status"] = "crawl_failed"
+            results["message"] = "Không thể crawl nội dung từ các bài báo tham khảo"
+            logger.error("All crawl attempts failed")
+            return None
+        return processed, reference_contents
+
+    async def _crawl_all(self, articles: List[Dict]) -> List[Any]:
+        # Chỉ cần tiêu đề + nội dung của bài tham khảo, nên gọi thẳng crawler
+        # thay vì _process_url (bỏ qua trích xuất từ khóa vốn chặn event loop mỗi bài)
+        return await self.preprocessor.crawler.extract_from_urls(
+            [article["url"] for article in articles]
+        )
 
-            results["status"] = "success"
-            results["verdict"] = verdict
-            results["highest_similarity"] = highest_similarity
-            results["similarity_details"] = similarity_results
-            results["top_references"] = [
+    def _build_verdict(
+        self,
+        results: Dict[str, Any],
+        reference_contents: List[Dict[str, Any]],
+        batch_results: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        similarity_results = []
+        for batch_item in batch_results:
+            original_index = batch_item["index"]
+            ref_metadata = reference_contents[original_index]
+            overall_sim = batch_item["similarity"]
+            similarity_results.append(
                 {
-                    "url": r["url"],
-                    "title": r["title"],
-                    "domain": r["domain"],
-                    "source": r.get("source", ""),
-                    "similarity": r["overall_similarity"],
+                    "url": ref_metadata["url"],
+                    "title": ref_metadata["title"],
+                    "domain": ref_metadata["domain"],
+                    "source": ref_metadata.get("source", ""),
+                    "overall_similarity": overall_sim,
+                    "detailed_similarity": None,
                 }
-                for r in top_results
-            ]
+            )
+            logger.info(f"{ref_metadata['domain']}: {overall_sim:.2%}")
 
-            logger.info("\n" + "=" * 70)
-            logger.info("FINAL VERDICT")
-            logger.info("=" * 70)
-            logger.info(f"Label: {verdict['label']}")
-            logger.info(f"Verdict: {verdict['verdict']}")
-            logger.info(f"Highest Similarity: {highest_similarity:.2%}")
-            logger.info(f"Confidence: {verdict['confidence']:.2%}")
-            logger.info(f"Color: {verdict['color']}")
-            logger.info("=" * 70 + "\n")
+        # --- BƯỚC 6: ĐƯA RA KẾT LUẬN (Kiểm tra Phủ định & Lấy Max) ---
+        logger.info("\n" + "=" * 70)
+        logger.info("STEP 6: GENERATING VERDICT (REFUTATION CHECK & MAX)")
+        logger.info("=" * 70)
 
-            return results
+        top_results = similarity_results[: min(3, len(similarity_results))]
+
+        final_scores = []
+
+        if not top_results:
+            highest_similarity = 0
+            top_scores = []
+        else:
+            for r in top_results:
+                title_lower = r["title"].lower()
+                score = r["overall_similarity"]
+                if score > 0.6 and self._REFUTE_RE.search(title_lower):
+                    logger.warning(f"Refutation detected: {r['title']}")
+                    final_scores.append(1.0 - score)  # Lật ngược điểm
+                else:
+                    final_scores.append(score)
+
+            top_scores = sorted(final_scores, reverse=True)
+            highest_similarity = top_scores[0] if top_scores else 0
+
+        logger.info(f"Adjusted Top scores: {[f'{s:.2%}' for s in top_scores]}")
+        logger.info(f"Calculated Adjusted Highest Similarity: {highest_similarity:.2%}")
+
+        verdict = self.similarity_checker.generate_verdict(highest_similarity)
+
+        results["status"] = "success"
+        results["verdict"] = verdict
+        results["highest_similarity"] = highest_similarity
+        results["similarity_details"] = similarity_results
+        results["top_references"] = [
+            {
+                "url": r["url"],
+                "title": r["title"],
+                "domain": r["domain"],
+                "source": r.get("source", ""),
+                "similarity": r["overall_similarity"],
+            }
+            for r in top_results
+        ]
 
-        except Exception as e:
-            logger.error(f"Lỗi trong quá trình fact checking: {str(e)}", exc_info=True)
-            results["status"] = "error"
-            results["error"] = str(e)
-            return results
+        logger.info("\n" + "=" * 70)
+        logger.info("FINAL VERDICT")
+        logger.info("=" * 70)
+        logger.info(f"Label: {verdict['label']}")
+        logger.info(f"Verdict: {verdict['verdict']}")
+        logger.info(f"Highest Similarity: {highest_similarity:.2%}")
+        logger.info(f"Confidence: {verdict['confidence']:.2%}")
+        logger.info(f"Color: {verdict['color']}")
+        logger.info("=" * 70 + "\n")
+
+        return results
 
     def format_result_for_frontend(self, results: Dict[str, Any]) -> Dict[str, Any]:
 
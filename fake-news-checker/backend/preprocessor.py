@@ -1,10 +1,16 @@
+import asyncio
 import logging
 import re
+from bisect import bisect_right
 from collections import Counter
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from typing import Any, Dict, List, Optional, Tuple
 
+import httpx
+import numpy as np
+
 try:
-    from keybert import KeyBERT
+    import torch
     from transformers import AutoModel, AutoTokenizer
     from underthesea import ner, sent_tokenize
 
@@ -12,8 +18,7 @@ try:
 except ImportError:
     PHOBERT_AVAILABLE = False
     logging.warning(
-        "PhoBERT/KeyBERT/Underthesea dependencies not available. "
-        "Using basic preprocessing."
+        "PhoBERT/Underthesea dependencies not available. " "Using basic preprocessing."
     )
 
 from crawler import Crawler
@@ -21,38 +26,94 @@ from text_utils import normalize_text
 
 logger = logging.getLogger(__name__)
 
+# Gộp các mẫu số liệu thành một biểu thức. Kết quả là các đoạn khớp không
+# chồng lấn theo thứ tự trái sang phải (không còn gom theo từng mẫu như trước);
+# tại mỗi vị trí, mẫu đứng trước trong alternation được ưu tiên
+_NUMBER_RE = re.compile(
+    r"\d+[\.,]\d+[\.,]\d+"
+    r"|\d+\s*(?:triệu|tỷ|nghìn|ngàn|tỉ)"
+    r"|\d+\s*%"
+    r"|\d{4,}"
+    r"|\d+[\.,]\d+",
+    re.IGNORECASE,
+)
+
+_PUNCT_SPLIT_RE = re.compile(r"([.,!?;:])")
+_PUNCT_TO_SPACE = str.maketrans(".,!?;:", "      ")
+_WORD_RE = re.compile(r"\w+")
+# Một ký tự chữ hoặc số (\w trừ "_"), tương đương str.isalnum() cho từng ký tự
+_ALNUM_RE = re.compile(r"[^\W_]")
+
 
 class TextPreprocessor:
-    def __init__(self, use_phobert: bool = True):
+    def __init__(
+        self,
+        use_phobert: bool = True,
+        http_client: Optional[httpx.AsyncClient] = None,
+        cache_enabled: bool = True,
+        cache_ttl_hours: int = 24,
+        process_pool: Optional[Executor] = None,
+        crawl_cache_path: Optional[str] = None,
+        crawl_cache_ttl_hours: int = 6,
+    ):
         self.use_phobert = use_phobert and PHOBERT_AVAILABLE
         self.stopwords = self._load_stopwords()
-        self.crawler = Crawler()
+        self.crawler = Crawler(
+            http_client=http_client,
+            cache_enabled=cache_enabled,
+            cache_ttl_hours=cache_ttl_hours,
+            process_pool=process_pool,
+            disk_cache_path=crawl_cache_path,
+            disk_cache_ttl_hours=crawl_cache_ttl_hours,
+        )
 
+        # PhoBERT (~500MB) luôn được nạp ngay khi khởi tạo (không còn nạp lười),
+        # ở thread nền song song với phần khởi tạo còn lại (model similarity,
+        # web searcher); các lần dùng chỉ chờ future này
+        self._phobert_future: Optional[Future] = None
         if self.use_phobert:
-            self._init_phobert()
-
+            loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="phobert")
+            self._phobert_future = loader.submit(self._init_phobert)
+            loader.shutdown(wait=False)
         logger.info(f"Preprocessor initialized (PhoBERT: {self.use_phobert})")
 
-    def _init_phobert(self):
+    @property
+    def phobert(self) -> Optional[Tuple[Any, Any]]:
+        if self._phobert_future is None:
+            return None
+        return self._phobert_future.result()
+
+    def _init_phobert(self) -> Optional[Tuple[Any, Any]]:
         try:
             logger.info("Loading PhoBERT models...")
             model_name = "vinai/phobert-base"
 
-            self.phobert_tokenizer = AutoTokenizer.from_pretrained(model_name)
-            self.phobert_model = AutoModel.from_pretrained(model_name)
-            self.phobert_model.eval()
-
-            # KeyBERT sẽ sử dụng mô hình PhoBERT làm nền
-            self.kw_model = KeyBERT(model=self.phobert_model)
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            model = AutoModel.from_pretrained(model_name).to(self.device)
+            if self.device == "cuda":
+                # fp16 trên GPU: tận dụng tensor core, giảm một nửa bộ nhớ
+                model.half()
+            else:
+                # CPU: lượng tử hóa động int8 các lớp Linear (trọng số nhỏ đi 4 lần)
+                model = torch.quantization.quantize_dynamic(
+                    model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+            model.eval()
 
-            logger.info(f"PhoBERT loaded successfully! (Model: {model_name})")
+            logger.info(
+                f"PhoBERT loaded successfully! (Model: {model_name}, "
+                f"device: {self.device})"
+            )
+            return tokenizer, model
 
         except Exception as e:
             logger.error(f"Failed to load PhoBERT: {e}", exc_info=True)
             self.use_phobert = False
+            return None
 
-    def _load_stopwords(self) -> set:
-        return set(
+    def _load_stopwords(self) -> frozenset:
+        return frozenset(
             [
                 "và",
                 "hoặc",
@@ -126,10 +187,8 @@ class TextPreprocessor:
         )
 
     def simple_tokenize(self, text: str) -> List[str]:
-        text = re.sub(r"([.,!?;:])", r" \1 ", text)
-        tokens = text.split()
-        tokens = [t.strip() for t in tokens if t.strip()]
-        return tokens
+        # str.split() đã bỏ token rỗng và khoảng trắng thừa
+        return _PUNCT_SPLIT_RE.sub(r" \1 ", text).split()
 
     def extract_title_from_text(self, text: str) -> str:
         if self.use_phobert:
@@ -137,16 +196,17 @@ class TextPreprocessor:
                 sentences = sent_tokenize(text)
                 if not sentences:
                     return text.split(".")[0].strip()
+                sentences = sentences[:5]
+                token_counts = self._count_ner_tokens_per_sentence(sentences)
                 scores = []
-                for i, sent in enumerate(sentences[:5]):
+                for i, sent in enumerate(sentences):
                     score = (5 - i) * 2
                     word_count = len(sent.split())
                     if 5 <= word_count <= 20:
                         score += 3
                     elif 3 <= word_count <= 25:
                         score += 1
-                    entities = ner(sent)
-                    score += len(entities)
+                    score += token_counts[i]
                     scores.append((sent, score))
                 best_sentence = max(scores, key=lambda x: x[1])[0]
                 return best_sentence.strip()
@@ -154,49 +214,184 @@ class TextPreprocessor:
                 logger.warning(f"PhoBERT title extraction failed: {e}")
         return text.split(".")[0].strip()
 
+    @staticmethod
+    def _count_ner_tokens_per_sentence(sentences: List[str]) -> List[int]:
+        # Gọi ner một lần cho cả đoạn đầu thay vì từng câu, sau đó chia
+        # token về câu chứa nó theo vị trí ký tự
+        starts = []
+        offset = 0
+        for sent in sentences:
+            starts.append(offset)
+            offset += len(sent) + 1
+        prefix = " ".join(sentences)
+
+        counts = [0] * len(sentences)
+        cursor = 0
+        for token in ner(prefix):
+            position = prefix.find(token[0], cursor)
+            if position == -1:
+                position = cursor
+            else:
+                cursor = position + len(token[0])
+            counts[bisect_right(starts, position) - 1] += 1
+        return counts
+
     def extract_keywords_phobert(self, text: str, top_n: int = 15) -> List[str]:
+        return self.extract_keywords_phobert_batch([text], top_n)[0]
+
+    def extract_keywords_phobert_batch(
+        self, texts: List[str], top_n: int = 15
+    ) -> List[List[str]]:
+        keywords_list: List[List[str]] = [[] for _ in texts]
+        phobert = self.phobert
+        if phobert is None:
+            return keywords_list
+        tokenizer, model = phobert
         try:
-            keywords = self.kw_model.extract_keywords(
-                text,
-                keyphrase_ngram_range=(1, 2),
-                stop_words=list(self.stopwords),
-                top_n=top_n,
-                use_mmr=True,  # Sử dụng MMR để đa dạng hóa kết quả
-                diversity=0.5,
+            words_list = [_WORD_RE.findall(text.lower()) for text in texts]
+            encoded = [self._encode_words(tokenizer, words) for words in words_list]
+            rows = [i for i, (_, spans) in enumerate(encoded) if spans]
+            if not rows:
+                return keywords_list
+
+            # Một lượt forward (có padding) cho cả lô: embedding của văn bản và
+            # của từng cụm từ ứng viên đều lấy từ cùng một hidden state
+            max_len = max(len(encoded[i][0]) for i in rows)
+            input_ids = torch.full(
+                (len(rows), max_len), tokenizer.pad_token_id, dtype=torch.long
             )
-            return [kw[0] for kw in keywords]
+            attention_mask = torch.zeros_like(input_ids)
+            for row, i in enumerate(rows):
+                ids = encoded[i][0]
+                input_ids[row, : len(ids)] = torch.tensor(ids)
+                attention_mask[row, : len(ids)] = 1
+            with torch.inference_mode():
+                hidden = model(
+                    input_ids=input_ids.to(self.device),
+                    attention_mask=attention_mask.to(self.device),
+                ).last_hidden_state
+            hidden = hidden.float().cpu().numpy()
+
+            for row, i in enumerate(rows):
+                ids, spans = encoded[i]
+                keywords_list[i] = self._keywords_from_hidden(
+                    words_list[i], spans, hidden[row, : len(ids)], top_n
+                )
+            return keywords_list
         except Exception as e:
-            logger.error(f"KeyBERT extraction failed: {e}")
+            logger.error(f"PhoBERT keyword extraction failed: {e}")
+            return [[] for _ in texts]
+
+    @staticmethod
+    def _encode_words(
+        tokenizer: Any, words: List[str], max_length: int = 256
+    ) -> Tuple[List[int], List[Tuple[int, int]]]:
+        # Tokenize từng từ để biết vị trí subword của mỗi từ trong chuỗi
+        # (tokenizer của PhoBERT không hỗ trợ offset_mapping)
+        input_ids = [tokenizer.cls_token_id]
+        spans = []
+        for word in words:
+            sub_ids = tokenizer.encode(word, add_special_tokens=False)
+            if len(input_ids) + len(sub_ids) >= max_length - 1:
+                break
+            spans.append((len(input_ids), len(input_ids) + len(sub_ids)))
+            input_ids.extend(sub_ids)
+        input_ids.append(tokenizer.sep_token_id)
+        return input_ids, spans
+
+    def _keywords_from_hidden(
+        self,
+        words: List[str],
+        spans: List[Tuple[int, int]],
+        hidden: np.ndarray,
+        top_n: int,
+        diversity: float = 0.5,
+    ) -> List[str]:
+        # Ứng viên: unigram và bigram liền kề không chứa stopword. Embedding
+        # của cụm = trung bình subword, lấy trung bình qua các lần xuất hiện
+        candidates: Dict[str, List[Any]] = {}
+        valid = [len(w) >= 2 and w not in self.stopwords for w in words[: len(spans)]]
+        for i, (start, end) in enumerate(spans):
+            if not valid[i]:
+                continue
+            phrases = [(words[i], start, end)]
+            if i + 1 < len(spans) and valid[i + 1]:
+                phrases.append((f"{words[i]} {words[i + 1]}", start, spans[i + 1][1]))
+            for phrase, phrase_start, phrase_end in phrases:
+                vector = hidden[phrase_start:phrase_end].mean(axis=0)
+                entry = candidates.setdefault(phrase, [0, 0])
+                entry[0] = entry[0] + vector
+                entry[1] += 1
+        if not candidates:
             return []
 
+        phrases = list(candidates)
+        phrase_embeddings = np.stack(
+            [total / count for total, count in candidates.values()]
+        )
+        doc_embedding = hidden[1:-1].mean(axis=0)
+        phrase_embeddings /= np.linalg.norm(phrase_embeddings, axis=1, keepdims=True)
+        doc_embedding /= np.linalg.norm(doc_embedding)
+
+        selected = self._mmr(doc_embedding, phrase_embeddings, top_n, diversity)
+        return [phrases[i] for i in selected]
+
+    @staticmethod
+    def _mmr(
+        doc_embedding: np.ndarray,
+        phrase_embeddings: np.ndarray,
+        top_n: int,
+        diversity: float,
+    ) -> List[int]:
+        # Maximal Marginal Relevance: vừa gần văn bản, vừa khác các cụm đã chọn
+        doc_similarity = phrase_embeddings @ doc_embedding
+        phrase_similarity = phrase_embeddings @ phrase_embeddings.T
+
+        selected = [int(np.argmax(doc_similarity))]
+        remaining = [i for i in range(len(doc_similarity)) if i != selected[0]]
+        while remaining and len(selected) < top_n:
+            redundancy = phrase_similarity[np.ix_(remaining, selected)].max(axis=1)
+            scores = (1 - diversity) * doc_similarity[
+                remaining
+            ] - diversity * redundancy
+            selected.append(remaining.pop(int(np.argmax(scores))))
+        return selected
+
     def extract_keywords_basic(self, text: str, top_n: int = 15) -> List[str]:
-        normalized = normalize_text(text)
-        tokens = self.simple_tokenize(normalized)
-        filtered_tokens = []
-        for token in tokens:
-            if token in ".,!?;:()-":
-                continue
-            if token.lower() in self.stopwords:
-                continue
-            if len(token) < 3 or token.isdigit():
-                continue
-            if not any(c.isalnum() for c in token):
-                continue
-            filtered_tokens.append(token.lower())
-        word_freq = Counter(filtered_tokens)
+        # normalize_text đã chuyển chữ thường. Thay dấu câu bằng khoảng trắng
+        # (str.translate) cho kết quả như simple_tokenize vì token dấu câu đơn
+        # lẻ đằng nào cũng bị loại; các phép kiểm tra rẻ được đặt trước
+        tokens = normalize_text(text).translate(_PUNCT_TO_SPACE).split()
+        word_freq = Counter(
+            token
+            for token in tokens
+            if len(token) >= 3
+            and token not in self.stopwords
+            and not token.isdigit()
+            and _ALNUM_RE.search(token)
+        )
         keywords = [word for word, freq in word_freq.most_common(top_n)]
         return keywords
 
     def extract_keywords(self, text: str, top_n: int = 15) -> List[str]:
+        return self.extract_keywords_batch([text], top_n)[0]
+
+    def extract_keywords_batch(
+        self, texts: List[str], top_n: int = 15
+    ) -> List[List[str]]:
         if self.use_phobert:
-            phobert_kws = self.extract_keywords_phobert(text, top_n)
-            if phobert_kws:
-                logger.info(
-                    f"Extracted {len(phobert_kws)} keywords via PhoBERT/KeyBERT"
-                )
-                return phobert_kws
-        logger.info("Using basic keyword extraction (fallback)")
-        return self.extract_keywords_basic(text, top_n)
+            keywords_list = self.extract_keywords_phobert_batch(texts, top_n)
+            logger.info(
+                f"Extracted keywords via PhoBERT (MMR) for "
+                f"{sum(map(bool, keywords_list))}/{len(texts)} text(s)"
+            )
+        else:
+            keywords_list = [[] for _ in texts]
+        for i, keywords in enumerate(keywords_list):
+            if not keywords:
+                logger.info("Using basic keyword extraction (fallback)")
+                keywords_list[i] = self.extract_keywords_basic(texts[i], top_n)
+        return keywords_list
 
     def extract_named_entities(self, text: str) -> List[Tuple[str, str]]:
         if not self.use_phobert:
@@ -209,58 +404,62 @@ class TextPreprocessor:
             return []
 
     def extract_numbers_from_text(self, text: str) -> List[str]:
-        patterns = [
-            r"\d+[\.,]\d+[\.,]\d+",
-            r"\d+\s*(?:triệu|tỷ|nghìn|ngàn|tỉ)",
-            r"\d+\s*%",
-            r"\d{4,}",
-            r"\d+[\.,]\d+",
-        ]
-        numbers = []
-        for pattern in patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            numbers.extend(matches)
-        unique_numbers = []
-        seen = set()
-        for num in numbers:
-            normalized = num.lower().replace(" ", "")
-            if normalized not in seen:
-                seen.add(normalized)
-                unique_numbers.append(num)
-        return unique_numbers[:3]
-
-    def process_input(
+        # Hiện chưa có nơi nào gọi hàm này (entities/numbers đang để trống).
+        # Duyệt văn bản một lần; dedupe theo dạng viết thường, bỏ khoảng trắng
+        unique_numbers: Dict[str, str] = {}
+        for match in _NUMBER_RE.finditer(text):
+            num = match.group(0)
+            unique_numbers.setdefault(num.lower().replace(" ", ""), num)
+            if len(unique_numbers) == 3:
+                break
+        return list(unique_numbers.values())
+
+    async def process_input(
         self, input_data: str, input_type: str = "text"
     ) -> Optional[Dict[str, Any]]:
         if input_type == "url":
             logger.info(f"Processing URL: {input_data}")
-            return self._process_url(input_data)
+            return await self._process_url(input_data)
 
         # Xử lý input_type == 'text'
-        logger.info(f"Processing text: {len(input_data)} characters")
-        normalized = normalize_text(input_data)
-
-        # Chỉ chạy trích xuất từ khóa (KeyBERT).
-        keywords = self.extract_keywords(normalized, top_n=15)
-        logger.info(f"Keywords: {keywords[:10]}")
-
-        entities = []
-        numbers = []
-
-        return {
-            "original_input": input_data,
-            "input_type": "text",
-            "title": "",
-            "content": normalized,
-            "full_text": normalized,
-            "keywords": keywords,
-            "entities": entities,
-            "numbers": numbers,
-            "domain": None,
-        }
+        return (await asyncio.to_thread(self.process_texts, [input_data]))[0]
+
+    def process_texts(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """Tiền xử lý nhiều input dạng text, trích xuất từ khóa theo lô."""
+        normalized_list = []
+        for text in texts:
+            logger.info(f"Processing text: {len(text)} characters")
+            normalized_list.append(normalize_text(text))
+
+        # Input quá ngắn sẽ bị FactChecker từ chối: không tốn lượt chạy PhoBERT
+        keywords_list: List[List[str]] = [[] for _ in texts]
+        long_indices = [i for i, n in enumerate(normalized_list) if len(n) >= 15]
+        if long_indices:
+            # Chỉ chạy trích xuất từ khóa (PhoBERT).
+            extracted = self.extract_keywords_batch(
+                [normalized_list[i] for i in long_indices], top_n=15
+            )
+            for i, keywords in zip(long_indices, extracted):
+                keywords_list[i] = keywords
+                logger.info(f"Keywords: {keywords[:10]}")
+
+        return [
+            {
+                "original_input": text,
+                "input_type": "text",
+                "title": "",
+                "content": normalized,
+                "full_text": normalized,
+                "keywords": keywords,
+                "entities": [],
+                "numbers": [],
+                "domain": None,
+            }
+            for text, normalized, keywords in zip(texts, normalized_list, keywords_list)
+        ]
 
-    def _process_url(self, url: str) -> Optional[Dict[str, Any]]:
-        extracted = self.crawler.extract_from_url(url)
+    async def _process_url(self, url: str) -> Optional[Dict[str, Any]]:
+        extracted = await self.crawler.extract_from_url(url)
         if not extracted:
             logger.error(f"Failed to extract content from URL: {url}")
             return None
@@ -277,8 +476,11 @@ class TextPreprocessor:
         )
         logger.info(f"Extracted {len(full_text)} characters from URL")
 
-        # Tối ưu logic: Chỉ chạy trích xuất từ khóa (KeyBERT).
-        keywords = self.extract_keywords(text_for_keywords, top_n=15)
+        # Tối ưu logic: Chỉ chạy trích xuất từ khóa (PhoBERT), trong threadpool
+        # để lượt forward không chặn event loop
+        keywords = await asyncio.to_thread(
+            self.extract_keywords, text_for_keywords, top_n=15
+        )
         logger.info(f"Keywords: {keywords[:10]}")
 
         entities = []
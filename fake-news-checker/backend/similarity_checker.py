@@ -1,47 +1,197 @@
-from typing import Any, Dict, List
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional
 
-from sentence_transformers import SentenceTransformer, util
+import numpy as np
+import torch
+from cachetools import LRUCache
+from sentence_transformers import SentenceTransformer
+
+from embedding_cache import EmbeddingCache
+
+logger = logging.getLogger(__name__)
 
 
 class SimilarityChecker:
     def __init__(
-        self, model_name: str = "bkai-foundation-models/vietnamese-bi-encoder"
+        self,
+        model_name: str = "bkai-foundation-models/vietnamese-bi-encoder",
+        embedding_cache: Optional[EmbeddingCache] = None,
+        max_seq_length: int = 256,
+        max_chars: int = 2000,
+        batch_size: int = 64,
+        query_cache_size: int = 512,
+        precision: str = "auto",
+        backend: str = "torch",
     ):
-        print(f"Loading model: {model_name}...")
-        self.model = SentenceTransformer(model_name)
-        print("Model loaded successfully!")
-
-    def encode_text(self, text: str) -> Any:
-        return self.model.encode(text, convert_to_tensor=True)
+        self.embedding_cache = embedding_cache
+        # Phần vượt quá max_seq_length token sẽ bị cắt bỏ khi encode, nên cắt
+        # sớm theo số ký tự để khỏi tốn công tokenize cả bài báo dài
+        self.max_chars = max_chars
+        self.batch_size = batch_size
+        # Embedding của query gần đây: cùng một bài được kiểm tra lặp lại
+        # (hoặc encode_text rồi so sánh) thì không phải encode lại
+        self._query_cache: LRUCache = LRUCache(maxsize=query_cache_size)
+        # LRUCache không thread-safe mà các hàm encode chạy qua asyncio.to_thread
+        # (nhiều lô có thể chạy cùng lúc), nên mọi lần đọc/ghi đều phải khóa
+        self._query_lock = threading.Lock()
+        logger.info(f"Loading model: {model_name} (backend: {backend})...")
+        self.backend = backend
+        self.model = self._load_model(model_name, backend)
+        # Giới hạn độ dài chuỗi: cả lô được pad tới chuỗi dài nhất, nên bài
+        # báo dài làm phình toàn bộ lượt forward
+        self.model.max_seq_length = max_seq_length
+        self.precision = self._apply_precision(precision)
+        logger.info(f"Model loaded successfully! (precision: {self.precision})")
+
+    def _load_model(self, model_name: str, backend: str) -> SentenceTransformer:
+        # onnx/openvino: sentence-transformers tự export model và chạy qua
+        # ONNX Runtime/OpenVINO (cần cài optimum); lỗi thì quay về PyTorch
+        if backend != "torch":
+            try:
+                return SentenceTransformer(model_name, backend=backend)
+            except Exception as e:
+                logger.warning(
+                    f"Backend {backend} not available ({e}), falling back to torch"
+                )
+                self.backend = "torch"
+        return SentenceTransformer(model_name)
+
+    def _apply_precision(self, precision: str) -> str:
+        # auto: fp16 trên GPU (tensor core), giữ fp32 trên CPU. int8 (lượng tử
+        # hóa động các lớp Linear) chỉ áp dụng trên CPU và phải bật tường minh
+        # vì làm lệch nhẹ điểm tương đồng so với các ngưỡng kết luận
+        if self.backend != "torch":
+            return "fp32"
+        device = self.model.device.type
+        if precision == "auto":
+            precision = "fp16" if device == "cuda" else "fp32"
+        if precision == "fp16" and device == "cuda":
+            self.model.half()
+            return "fp16"
+        if precision == "int8" and device == "cpu":
+            self.model = torch.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+            return "int8"
+        return "fp32"
+
+    def encode_text(self, text: str) -> np.ndarray:
+        # Cùng cách encode với các hàm so sánh để kết quả dùng lẫn được
+        key = self._query_key(text)
+        with self._query_lock:
+            vector = self._query_cache.get(key)
+        if vector is None:
+            vector = self._encode([text[: self.max_chars]])[0]
+            with self._query_lock:
+                self._query_cache[key] = vector
+        return vector
+
+    def _query_key(self, text: str) -> bytes:
+        return hashlib.blake2b(text[: self.max_chars].encode(), digest_size=16).digest()
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            # Thanh tiến trình tqdm tốn chi phí cho mỗi lần gọi và làm rác log
+            show_progress_bar=False,
+        )
 
     def calculate_similarity(self, text1: str, text2: str) -> float:
-        embedding1 = self.encode_text(text1)
-        embedding2 = self.encode_text(text2)
-
-        similarity = util.cos_sim(embedding1, embedding2)
+        # Encode cả hai câu trong một lần gọi, vector đã chuẩn hóa L2
+        # nên cosine similarity chính là tích vô hướng
+        embedding1, embedding2 = self._encode(
+            [text1[: self.max_chars], text2[: self.max_chars]]
+        )
 
-        return float(similarity[0][0])
+        return float(np.dot(embedding1, embedding2))
 
     def calculate_similarity_batch(
-        self, query_text: str, reference_texts: List[str]
+        self,
+        query_text: str,
+        reference_texts: List[str],
     ) -> List[Dict[str, Any]]:
-        query_embedding = self.encode_text(query_text)
-
-        reference_embeddings = self.model.encode(
-            reference_texts, convert_to_tensor=True
+        return self.calculate_similarity_multi([query_text], [reference_texts])[0]
+
+    def calculate_similarity_multi(
+        self,
+        query_texts: List[str],
+        reference_text_lists: List[List[str]],
+    ) -> List[List[Dict[str, Any]]]:
+        all_references = [
+            text[: self.max_chars] for texts in reference_text_lists for text in texts
+        ]
+        if self.embedding_cache is None:
+            all_keys = [None] * len(all_references)
+        else:
+            all_keys = [self.embedding_cache.make_key(text) for text in all_references]
+        cached = [self.embedding_cache.get(key) if key else None for key in all_keys]
+
+        query_keys = [self._query_key(text) for text in query_texts]
+        with self._query_lock:
+            query_vectors = [self._query_cache.get(key) for key in query_keys]
+
+        # Encode toàn bộ query và reference chưa có trong cache của cả lô
+        # trong một lần gọi model; bài trùng nhau giữa các yêu cầu chỉ encode
+        # một lần. Vector đã chuẩn hóa L2 nên cosine similarity chỉ còn là
+        # tích vô hướng
+        to_encode = dict.fromkeys(
+            text[: self.max_chars]
+            for text, vector in zip(query_texts, query_vectors)
+            if vector is None
         )
-
-        # Tính toán cosine similarity (1-vs-N)
-        similarities = util.cos_sim(query_embedding, reference_embeddings)[0]
-
-        results = []
-        for idx, (text, sim) in enumerate(zip(reference_texts, similarities)):
-            results.append({"text": text, "similarity": float(sim), "index": idx})
-
-        # Sắp xếp kết quả, điểm cao nhất lên đầu
-        results.sort(key=lambda x: x["similarity"], reverse=True)
-
-        return results
+        to_encode.update(
+            dict.fromkeys(
+                text for text, vector in zip(all_references, cached) if vector is None
+            )
+        )
+        fresh = dict(zip(to_encode, self._encode(list(to_encode)))) if to_encode else {}
+        for i, (text, key, vector) in enumerate(
+            zip(query_texts, query_keys, query_vectors)
+        ):
+            if vector is None:
+                vector = fresh[text[: self.max_chars]].copy()
+                with self._query_lock:
+                    self._query_cache[key] = vector
+                query_vectors[i] = vector
+        reference_vectors = []
+        for text, key, vector in zip(all_references, all_keys, cached):
+            if vector is None:
+                vector = fresh[text]
+                if key:
+                    self.embedding_cache.set(key, vector)
+            reference_vectors.append(vector)
+
+        batch_results = []
+        offset = 0
+        for query_idx, reference_texts in enumerate(reference_text_lists):
+            reference_embeddings = reference_vectors[
+                offset : offset + len(reference_texts)
+            ]
+            offset += len(reference_texts)
+            if not reference_embeddings:
+                batch_results.append([])
+                continue
+
+            # Tính toán cosine similarity (1-vs-N) bằng một phép nhân ma trận
+            similarities = (
+                np.stack(reference_embeddings) @ query_vectors[query_idx]
+            ).tolist()
+
+            results = [
+                {"text": text, "similarity": sim, "index": idx}
+                for idx, (text, sim) in enumerate(zip(reference_texts, similarities))
+            ]
+
+            # Sắp xếp kết quả, điểm cao nhất lên đầu
+            results.sort(key=lambda x: x["similarity"], reverse=True)
+            batch_results.append(results)
+
+        return batch_results
 
     def generate_verdict(self, similarity_score: float) -> Dict[str, Any]:
         if similarity_score >= 0.85:
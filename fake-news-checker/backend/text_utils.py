@@ -1,19 +1,48 @@
 import re
 import unicodedata
+from functools import lru_cache
 from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
+# Tham số theo dõi (tracking) không ảnh hưởng tới nội dung bài báo
+_TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "zarsrc")
 
+# Ký tự không được giữ lại. Chữ cái tiếng Việt có dấu đã thuộc \w (Unicode)
+# nên không cần liệt kê riêng
+_DISALLOWED_CHARS_RE = re.compile(r"[^\w\s.,!?;:\-\(\)]")
+
+
+# Cùng một đoạn văn bản (tiêu đề, bài báo được trích dẫn lại, input lặp lại)
+# thường được chuẩn hóa nhiều lần; kết quả chỉ phụ thuộc vào input nên cache được
+@lru_cache(maxsize=256)
 def normalize_text(text: Optional[str]) -> str:
     if not text:
         return ""
 
     text = unicodedata.normalize("NFC", text)
     text = text.lower()
-    text = re.sub(
-        r"[^\w\s.,!?;:\-\(\)áàảãạăắằẳẵặâấầẩẫậéèẻẽẹêếềểễệíìỉĩịóòỏõọôốồổỗộơớờởỡợúùủũụưứừửữựýỳỷỹỵđ]",
-        " ",
-        text,
-    )
+    text = _DISALLOWED_CHARS_RE.sub(" ", text)
+
+    # Gộp khoảng trắng: split()/join nhanh hơn re.sub(r"\s+") và tự strip
+    return " ".join(text.split())
 
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    query = urlencode(
+        [
+            (k, v)
+            for k, v in parse_qsl(parts.query, keep_blank_values=True)
+            if not k.lower().startswith(_TRACKING_PARAMS)
+        ]
+    )
+    # Bỏ dấu "/" cuối: ".../bai-viet/" và ".../bai-viet" là cùng một trang
+    return urlunsplit(
+        (
+            parts.scheme.lower(),
+            parts.netloc.lower(),
+            parts.path.rstrip("/"),
+            query,
+            "",
+        )
+    )
@@ -1,11 +1,13 @@
+import asyncio
 import hashlib
 import logging
-import time
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
 from urllib.parse import urlparse  # <-- Đã xóa 'quote_plus' (F401)
 
-import requests
+import httpx
+
+from text_utils import normalize_url
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -44,6 +46,7 @@ class WebSearcher:
         google_api_key: Optional[str] = None,
         google_cse_id: Optional[str] = None,
         cache_enabled: bool = True,
+        http_client: Optional[httpx.AsyncClient] = None,
     ):
 
         self.google_api_key = google_api_key
@@ -72,6 +75,14 @@ class WebSearcher:
 
         self.cache = SmartCache(ttl_hours=24) if cache_enabled else None
 
+        # Client dùng chung (tạo trong lifespan của API); tự tạo nếu chạy độc lập
+        self._owns_http_client = http_client is None
+        self.http_client = http_client or httpx.AsyncClient()
+
+    async def aclose(self):
+        if self._owns_http_client:
+            await self.http_client.aclose()
+
     def build_smart_queries(self, keywords: List[str]) -> List[str]:
 
         if not keywords:
@@ -98,7 +109,7 @@ class WebSearcher:
         unique_queries = list(dict.fromkeys(queries))
         return unique_queries[:3]  # Giới hạn 3 truy vấn
 
-    def search_google_custom_api(
+    async def search_google_custom_api(
         self, query: str, num_results: int = 10
     ) -> List[Dict[str, Any]]:
         if not self.google_api_key or not self.google_cse_id:
@@ -123,7 +134,7 @@ class WebSearcher:
             }
 
             logger.info(f"Google Custom Search API: {query}")
-            response = requests.get(url, params=params, timeout=10)
+            response = await self.http_client.get(url, params=params, timeout=10)
             response.raise_for_status()
             data = response.json()
             results = []
@@ -150,7 +161,7 @@ class WebSearcher:
             logger.error(f"  Google API error: {str(e)[:100]}")
             return []
 
-    def search_for_fact_check(
+    async def search_for_fact_check(
         self, processed_data: Dict, num_results: int = 10
     ) -> List[Dict[str, Any]]:
 
@@ -190,21 +201,20 @@ class WebSearcher:
                     continue
 
             logger.info("  [Strategy 1] Google Custom Search API...")
-            api_results = self.search_google_custom_api(query, num_results)
+            api_results = await self.search_google_custom_api(query, num_results)
             query_results.extend(api_results)
 
             if self.cache and query_results:
                 self.cache.set(query, query_results)
 
             all_results.extend(query_results)
-            time.sleep(0.5)
+            await asyncio.sleep(0.5)
 
-        # De-duplicate (Loại bỏ trùng lặp)
+        # De-duplicate (Loại bỏ trùng lặp) theo URL chuẩn hóa: cùng một bài
+        # với tham số utm_/fbclid khác nhau chỉ được crawl một lần
         unique_results = {}
         for result in all_results:
-            url = result["url"]
-            if url not in unique_results:
-                unique_results[url] = result
+            unique_results.setdefault(normalize_url(result["url"]), result)
 
         final_results = list(unique_results.values())[:num_results]
 